@@ -0,0 +1,16 @@
+from .analysis import TrackAnalysis, analyse_track
+from .engine import AudioEngine, CommandLatency
+from .library import LibraryIndex, TrackDescriptor, VALID_FILE_TYPES
+from .metadata import MetadataCache, extract_metadata
+from .status import AudioStatusStream, track_summary
+from .track_queue import LazyTrackQueue
+from .transcode import TranscodeCache, transcode_library
+from .workers import TrackJobs, WorkerPool
+
+__all__ = [
+    'AudioEngine', 'CommandLatency', 'LibraryIndex', 'TrackDescriptor',
+    'VALID_FILE_TYPES', 'MetadataCache', 'extract_metadata',
+    'AudioStatusStream', 'track_summary', 'LazyTrackQueue',
+    'TranscodeCache', 'transcode_library', 'TrackAnalysis', 'analyse_track',
+    'TrackJobs', 'WorkerPool',
+]
@@ -0,0 +1,198 @@
+import asyncio
+import math
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .library import TrackDescriptor
+from .loudness import PEAK_CEILING_DB, measure_loudness
+from .metadata import MetadataCache
+from .peaks import PEAKS_SUFFIX, decode_pcm, write_peaks
+from .workers import TrackJobs, WorkerPool
+
+
+def analyse_track(source: str, peaks_path: str, ffmpeg: Optional[str] = None) -> Dict:
+    """Decode one track once; write its peak file and return its loudness."""
+    samples, sample_rate = decode_pcm(source, ffmpeg)
+    write_peaks(samples, sample_rate, peaks_path)
+    return measure_loudness(samples, sample_rate)
+
+
+class TrackAnalysis(TrackJobs):
+    """Waveform peaks and loudness for every library track, from one decode.
+
+    Peaks are stored per content hash as a small binary file holding min/max
+    int8 pairs at several resolutions; the HTTP endpoint serves whichever
+    level suits the requested width. Loudness measurements go into the
+    metadata cache's database and ``gain`` derives the playback factor on lookup, so
+    changing the target never needs a re-scan. Decoding reads the transcode
+    cache when there is one, so it is a plain WAV read.
+    """
+
+    def __init__(
+        self,
+        metadata: MetadataCache,
+        pool: WorkerPool,
+        peaks_dir: Path,
+        target: float = -14.0,
+        max_boost_db: float = 0.0,
+        transcode=None,
+        ffmpeg: Optional[str] = None,
+    ):
+        super().__init__(metadata, pool, transcode)
+        self.peaks_dir = Path(peaks_dir)
+        self.target = target
+        self.max_boost_db = max_boost_db
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.measurements: Dict[str, Dict] = {}
+        self.analysed = 0
+        self.failed = 0
+        self.init_db()
+
+    # Storage
+
+    def init_db(self):
+        connection = self.metadata.connect()
+        try:
+            connection.execute("""
+            CREATE TABLE IF NOT EXISTS track_loudness (
+                content_hash TEXT PRIMARY KEY,
+                loudness REAL,
+                peak REAL,
+                analysed_at REAL
+            )""")
+            connection.commit()
+            cursor = connection.execute(
+                "SELECT content_hash, loudness, peak FROM track_loudness"
+            )
+            self.measurements = {
+                content_hash: {"loudness": loudness, "peak": peak}
+                for content_hash, loudness, peak in cursor.fetchall()
+            }
+        finally:
+            connection.close()
+
+    def _write(self, content_hash: str, measurement: Dict):
+        connection = self.metadata.connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO track_loudness "
+                    "(content_hash, loudness, peak, analysed_at) VALUES (?, ?, ?, ?)",
+                    (content_hash, measurement["loudness"], measurement["peak"], time.time()),
+                )
+        finally:
+            connection.close()
+
+    def _delete(self, content_hashes: List[str]):
+        connection = self.metadata.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "DELETE FROM track_loudness WHERE content_hash = ?",
+                    [(content_hash,) for content_hash in content_hashes],
+                )
+        finally:
+            connection.close()
+
+    def peaks_path(self, content_hash: str) -> Path:
+        return self.peaks_dir / f"{content_hash}{PEAKS_SUFFIX}"
+
+    # Lookups
+
+    def lookup(self, track: TrackDescriptor) -> Optional[Path]:
+        """Peak file for ``track``, if it has been analysed."""
+        row = self.metadata.get(track)
+        if row is None or not row["content_hash"]:
+            return None
+        path = self.peaks_path(row["content_hash"])
+        return path if path.exists() else None
+
+    def content_hash(self, track: TrackDescriptor) -> Optional[str]:
+        row = self.metadata.get(track)
+        return row["content_hash"] if row is not None else None
+
+    def get(self, track: TrackDescriptor) -> Optional[Dict]:
+        row = self.metadata.get(track)
+        if row is None:
+            return None
+        return self.measurements.get(row["content_hash"])
+
+    def gain(self, track: TrackDescriptor) -> float:
+        """Linear factor for ``AudioSink.set_volume`` for ``track``.
+
+        Moves it towards ``target`` LUFS without pushing its peak over the
+        ceiling or boosting by more than ``max_boost_db``.
+        """
+        measurement = self.get(track)
+        if measurement is None or measurement["loudness"] is None:
+            return 1.0
+        gain_db = min(self.target - measurement["loudness"], self.max_boost_db)
+        if measurement["peak"]:
+            headroom_db = PEAK_CEILING_DB - 20 * math.log10(measurement["peak"])
+            gain_db = min(gain_db, headroom_db)
+        return 10 ** (gain_db / 20)
+
+    def request(self, track: TrackDescriptor):
+        """Queue one track now, e.g. because a client asked for its waveform."""
+        row = self.metadata.get(track)
+        if row is None:
+            self.metadata.enqueue([track])
+        elif self._task is not None:
+            self.enqueue([row])
+
+    # Analysis
+
+    def wants(self, row: Dict) -> bool:
+        return (
+            row["content_hash"] not in self.measurements
+            or not self.peaks_path(row["content_hash"]).exists()
+        )
+
+    def prune(self) -> int:
+        """Drop peak files and measurements no current library track maps to."""
+        live = self.live_hashes()
+        removed = 0
+        for cached in self.peaks_dir.glob(f"*{PEAKS_SUFFIX}"):
+            if cached.stem not in live:
+                cached.unlink(missing_ok=True)
+                removed += 1
+        gone = [content_hash for content_hash in self.measurements if content_hash not in live]
+        if gone:
+            self._delete(gone)
+            for content_hash in gone:
+                del self.measurements[content_hash]
+        return removed + len(gone)
+
+    async def idle(self):
+        await asyncio.to_thread(self.prune)
+
+    def start(self):
+        self.peaks_dir.mkdir(parents=True, exist_ok=True)
+        super().start()
+
+    async def process(self, path: str, mtime: float, content_hash: str):
+        try:
+            measurement = await self.pool.run(
+                analyse_track,
+                self.source(path, mtime),
+                str(self.peaks_path(content_hash)),
+                self.ffmpeg,
+            )
+        except Exception as e:
+            self.failed += 1
+            print(f"Track analysis failed for {Path(path).name}: {e!r}")
+            return
+        await asyncio.to_thread(self._write, content_hash, measurement)
+        self.measurements[content_hash] = measurement
+        self.analysed += 1
+
+    def stats(self) -> Dict:
+        return {
+            "cached": len(self.measurements),
+            "pending": len(self._queued),
+            "analysed": self.analysed,
+            "failed": self.failed,
+            "target": self.target,
+        }
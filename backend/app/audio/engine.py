@@ -0,0 +1,364 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from rpaudio import AudioChannel, AudioSink
+from rpaudio.effects import FadeIn, FadeOut
+
+from .status import AudioStatusStream, track_summary
+from .library import LibraryIndex, TrackDescriptor
+from .analysis import TrackAnalysis
+from .metadata import MetadataCache
+from .transcode import TranscodeCache
+from .track_queue import LazyTrackQueue
+
+
+class CommandLatency:
+    """Rolling end-to-end latency (websocket receive -> command applied) in ms."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.last: Dict[str, float] = {}
+        self.count = 0
+
+    def record(self, command_type: str, received_at: float) -> float:
+        latency_ms = (time.perf_counter() - received_at) * 1000
+        self.samples.append(latency_ms)
+        self.last[command_type] = latency_ms
+        self.count += 1
+        return latency_ms
+
+    def summary(self) -> Dict:
+        if not self.samples:
+            return {"count": 0, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0, "last_ms": {}}
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return {
+            "count": self.count,
+            "avg_ms": round(sum(ordered) / len(ordered), 3),
+            "p95_ms": round(p95, 3),
+            "max_ms": round(ordered[-1], 3),
+            "last_ms": {name: round(value, 3) for name, value in self.last.items()},
+        }
+
+
+class AudioEngine:
+    """Event-driven audio command engine.
+
+    Commands are applied the moment they land on the queue. Playback state
+    changes arrive through the rpaudio sink callback, which is bridged onto the
+    event loop as an internal ``audio_stopped`` command. The only timer left is
+    the progress ticker, and it only runs while a track is actually playing.
+    """
+
+    def __init__(
+        self,
+        library: LibraryIndex,
+        publish: Callable[..., None],
+        progress_interval: float = 0.5,
+        prefetch: int = 3,
+        metadata: Optional[MetadataCache] = None,
+        transcode: Optional[TranscodeCache] = None,
+        loudness: Optional[TrackAnalysis] = None,
+    ):
+        self.library = library
+        self.metadata = metadata
+        self.transcode = transcode
+        self.loudness = loudness
+        self.publish = publish
+        self.progress_interval = progress_interval
+        self.prefetch = prefetch
+        self.commands: asyncio.Queue = asyncio.Queue()
+        self.latency = CommandLatency()
+        self.status = AudioStatusStream(publish)
+
+        self.channel: Optional[AudioChannel] = None
+        self.tracks: Optional[LazyTrackQueue] = None
+        self.effects = []
+        # The slider value; each sink plays at this times its loudness gain
+        self.volume = 1.0
+        self.auto_play = False
+        self.reload_channel = True
+        self.player_hidden = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._progress_task: Optional[asyncio.Task] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self._handlers = {
+            "play": self._handle_play,
+            "pause": self._handle_pause,
+            "skip": self._handle_skip,
+            "autoplay": self._handle_autoplay,
+            "volume": self._handle_volume,
+            "speed": self._handle_speed,
+            "seek": self._handle_seek,
+            "set_effects": self._handle_set_effects,
+            "reload_on_finish": self._handle_reload_on_finish,
+            "info_request": self._handle_info_request,
+            "player_hidden": self._handle_player_hidden,
+            "audio_stopped": self._handle_audio_stopped,
+        }
+
+    def submit(self, command: Dict, received_at: Optional[float] = None):
+        """Queue a command, stamping it so its latency can be measured."""
+        command["received_at"] = received_at if received_at is not None else time.perf_counter()
+        self.commands.put_nowait(command)
+
+    def on_audio_stop(self):
+        # rpaudio invokes sink callbacks from its playback thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(
+                self.commands.put_nowait, {"type": "audio_stopped"}
+            )
+
+    def _make_sink(self, track: TrackDescriptor) -> AudioSink:
+        # Runs in a worker thread; decoding must stay off the event loop
+        path = self.transcode.resolve(track) if self.transcode is not None else track.path
+        audio_sink = AudioSink(callback=self.on_audio_stop).load_audio(path)
+        audio_sink.set_volume(self.volume * self._gain(track))
+        return audio_sink
+
+    def _gain(self, track: Optional[TrackDescriptor]) -> float:
+        if self.loudness is None or track is None:
+            return 1.0
+        return self.loudness.gain(track)
+
+    def _describe(self, track: TrackDescriptor) -> Dict:
+        if self.metadata is not None:
+            return self.metadata.summary(track)
+        return track.summary()
+
+    def _on_track_skipped(self, index: int, track: TrackDescriptor):
+        self.status.queue_remove(index, 1)
+        self.status.commit()
+
+    async def create_audio_channel(self) -> AudioChannel:
+        await self.library.ensure_scanned()
+        tracks = self.library.tracks()
+        channel = AudioChannel()
+        if self.effects:
+            channel.set_effects_chain(self.effects)
+
+        self.tracks = LazyTrackQueue(
+            tracks, self._make_sink, window=self.prefetch, on_skip=self._on_track_skipped
+        )
+        self.status.reset_queue([self._describe(track) for track in tracks])
+        # Only the first window is loaded up front; the rest streams in later
+        await self.tracks.fill(channel)
+        return channel
+
+    async def _refill(self):
+        if self.tracks.exhausted and self.reload_channel:
+            tracks = self.library.tracks()
+            self.status.queue_insert(
+                len(self.tracks), [self._describe(track) for track in tracks]
+            )
+            self.status.commit()
+            self.tracks.extend(tracks)
+        if self.channel is not None:
+            await self.tracks.fill(self.channel)
+
+    def _schedule_refill(self):
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self.channel = await self.create_audio_channel()
+        print("channel created")
+        self.status.commit()
+
+        while True:
+            command = await self.commands.get()
+            handler = self._handlers.get(command.get("type"))
+            if handler is None:
+                print(f"Invalid command: {command}")
+                continue
+
+            try:
+                await handler(command)
+            except Exception as e:
+                print(f"Error handling command {command.get('type')}: {e}")
+            self.status.commit()
+
+            if "received_at" in command:
+                self.latency.record(command["type"], command["received_at"])
+
+    def stop(self):
+        self._stop_progress()
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+
+    # Status helpers
+
+    def _current_audio(self):
+        if self.channel is None:
+            return None
+        return self.channel.current_audio
+
+    def _is_playing(self) -> bool:
+        current = self._current_audio()
+        return current is not None and current.is_playing
+
+    def _sync_playback(self, track_changed: bool = False):
+        self.status.update(is_playing=self._is_playing())
+        if not track_changed:
+            return
+        self._sync_queue()
+        current = self._current_audio()
+        if current is not None:
+            # Prefetched sinks may predate the last volume change
+            current.set_volume(self.volume * self._gain(self.tracks.current))
+        playback_data = current.playback_data() if current is not None else None
+        summary = track_summary(playback_data)
+        if playback_data and self.tracks is not None and self.tracks.current is not None:
+            # Library name, so clients can fetch per-track data such as peaks
+            summary["path"] = self.tracks.current.name
+        self.status.update(current_audio=summary)
+        self.status.position(playback_data.get("position") if playback_data else None)
+
+    def _sync_queue(self):
+        if self.channel is None:
+            self.status.reset_queue([])
+            return
+        # rpaudio consumes from the front, so only the head can have gone
+        consumed = self.tracks.advance(self.channel)
+        if consumed > 0:
+            self.status.queue_remove(0, consumed)
+            self._schedule_refill()
+
+    async def _wait_for(self, predicate: Callable[[], bool], timeout: float = 2.0) -> bool:
+        # The channel's consume thread hands over the next sink shortly after
+        # auto_consume is set or the previous sink ends; wait out that handover
+        # only, never the steady state.
+        deadline = self._loop.time() + timeout
+        while not predicate():
+            if self._loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    # Progress ticker
+
+    def _start_progress(self):
+        if self.player_hidden:
+            return
+        if self._progress_task is None or self._progress_task.done():
+            self._progress_task = asyncio.create_task(self._progress_loop())
+
+    def _stop_progress(self):
+        if self._progress_task is not None:
+            self._progress_task.cancel()
+            self._progress_task = None
+
+    async def _progress_loop(self):
+        while not self.player_hidden:
+            current = self._current_audio()
+            if current is None or not current.is_playing:
+                break
+            self.status.tick(current.playback_data().get("position"))
+            await asyncio.sleep(self.progress_interval)
+
+    # Command handlers
+
+    async def _handle_play(self, command: Dict):
+        current = self._current_audio()
+        if current is not None and not current.is_playing:
+            current.play()
+            self._start_progress()
+            self._sync_playback()
+
+    async def _handle_pause(self, command: Dict):
+        current = self._current_audio()
+        if current is not None and current.is_playing:
+            current.pause()
+            self._stop_progress()
+            self._sync_playback()
+
+    async def _handle_skip(self, command: Dict):
+        current = self._current_audio()
+        if current is not None:
+            # The sink callback fires on stop and drives the track change
+            current.stop()
+
+    async def _handle_autoplay(self, command: Dict):
+        self.auto_play = not self.auto_play
+        if self.channel is None:
+            self.channel = await self.create_audio_channel()
+        self.channel.auto_consume = self.auto_play
+
+        if self.auto_play:
+            if await self._wait_for(lambda: self._current_audio() is not None):
+                self._current_audio().play()
+                self._start_progress()
+
+        self.status.update(auto_play=self.auto_play)
+        self._sync_playback(track_changed=True)
+
+    async def _handle_volume(self, command: Dict):
+        self.volume = float(command["volume"]["value"])
+        current = self._current_audio()
+        if current is not None:
+            current.set_volume(self.volume * self._gain(self.tracks.current))
+        self.status.update(volume=self.volume)
+
+    async def _handle_speed(self, command: Dict):
+        current = self._current_audio()
+        if current is not None:
+            current.set_speed(float(command["speed"]["value"]))
+
+    async def _handle_seek(self, command: Dict):
+        current = self._current_audio()
+        if current is not None:
+            current.try_seek(max(0.0, float(command["position"])))
+            self.status.tick(current.playback_data().get("position"))
+
+    async def _handle_set_effects(self, command: Dict):
+        if command.get("effects") == "fade_in":
+            self.effects.append(FadeIn(duration=5.0))
+        elif command.get("effects") == "fade_out":
+            self.effects.append(FadeOut(duration=5.0))
+
+        if self.channel is not None:
+            self.channel.set_effects_chain(self.effects)
+        self.status.update(
+            effects=[effect.__class__.__name__ for effect in self.effects]
+        )
+
+    async def _handle_reload_on_finish(self, command: Dict):
+        self.reload_channel = command["reload_on_finish"]
+        self.status.update(reload_on_finish=self.reload_channel)
+
+    async def _handle_info_request(self, command: Dict):
+        self.player_hidden = False
+        self.status.update(volume=self.volume)
+        current = self._current_audio()
+        if current is not None and current.is_playing:
+            self._start_progress()
+        self.status.commit()
+        self.publish(self.status.snapshot(latency=self.latency.summary()), "snapshot")
+
+    async def _handle_player_hidden(self, command: Dict):
+        self.player_hidden = command["player_hidden"]
+        if self.player_hidden:
+            self._stop_progress()
+
+    async def _handle_audio_stopped(self, command: Dict):
+        self._stop_progress()
+        if self.channel is None:
+            return
+
+        self._sync_queue()
+        if len(self.channel.queue_contents) == 0 and not self._is_playing():
+            if self.tracks.exhausted and not self.reload_channel:
+                self.channel = None
+                self._sync_playback(track_changed=True)
+                return
+            # The window ran dry (e.g. a burst of skips); wait for the refill
+            self._schedule_refill()
+            await self._refill_task
+
+        if self.auto_play and await self._wait_for(self._is_playing):
+            self._start_progress()
+        self._sync_playback(track_changed=True)
@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+try:
+    from watchfiles import awatch
+except ImportError:  # fall back to interval rescans
+    awatch = None
+
+VALID_FILE_TYPES = [".mp3", ".wav", ".mp4"]
+SORT_KEYS = ("name", "mtime", "size")
+MATCH_MODES = ("substring", "prefix")
+
+
+class TrackDescriptor(NamedTuple):
+    """What we know about a library file without decoding it."""
+
+    path: str
+    name: str
+    size: int = 0
+    mtime: float = 0.0
+
+    def summary(self) -> Dict:
+        return {"title": Path(self.name).stem, "path": self.name}
+
+
+class LibraryIndex:
+    """Shared, persisted index of the music folder.
+
+    The index is loaded from disk at startup and kept current by incremental
+    rescans: a file is only re-recorded when its size or mtime changed. Rescans
+    run on a filesystem watcher when ``watchfiles`` is available, and on a
+    fixed interval otherwise. Listeners registered with ``subscribe`` get
+    ``(added, changed, removed)`` after every rescan that found something.
+    """
+
+    def __init__(
+        self,
+        music_dir: Optional[str],
+        index_path: Path,
+        rescan_interval: float = 300.0,
+        watch: bool = True,
+    ):
+        self.music_dir = Path(music_dir) if music_dir else None
+        self.index_path = Path(index_path)
+        self.rescan_interval = rescan_interval
+        self.watch = watch and awatch is not None
+        self.entries: Dict[str, TrackDescriptor] = {}
+        self.scanned = False
+        self._listeners: List[Callable] = []
+        self._sorted: Dict[str, List[TrackDescriptor]] = {}
+        self._folded_names: List[str] = []
+        self._folded_search: List[str] = []
+        # Optional richer text for substring search (e.g. cached tags)
+        self.search_text: Optional[Callable[[TrackDescriptor], str]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.load()
+
+    # Persistence
+
+    def load(self):
+        if not self.index_path.exists() or self.music_dir is None:
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable library index: {e}")
+            return
+        if stored.get("music_dir") != str(self.music_dir):
+            return
+        self.entries = {
+            name: TrackDescriptor(str(self.music_dir / name), name, size, mtime)
+            for name, size, mtime in stored.get("tracks", [])
+        }
+        self._invalidate()
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "music_dir": str(self.music_dir),
+                    "tracks": [[t.name, t.size, t.mtime] for t in self.entries.values()],
+                },
+                f,
+            )
+        os.replace(tmp_path, self.index_path)
+
+    # Scanning
+
+    def _scan(self):
+        entries = {}
+        added, changed = [], []
+        with os.scandir(self.music_dir) as it:
+            for dir_entry in it:
+                if not dir_entry.is_file() or Path(dir_entry.name).suffix not in VALID_FILE_TYPES:
+                    continue
+                stat = dir_entry.stat()
+                known = self.entries.get(dir_entry.name)
+                if known is not None and known.size == stat.st_size and known.mtime == stat.st_mtime:
+                    entries[dir_entry.name] = known
+                    continue
+                track = TrackDescriptor(dir_entry.path, dir_entry.name, stat.st_size, stat.st_mtime)
+                entries[dir_entry.name] = track
+                (changed if known is not None else added).append(track)
+        removed = [track for name, track in self.entries.items() if name not in entries]
+        return entries, added, changed, removed
+
+    async def rescan(self) -> Dict:
+        if self.music_dir is None:
+            return {"added": 0, "changed": 0, "removed": 0}
+        async with self._lock:
+            entries, added, changed, removed = await asyncio.to_thread(self._scan)
+            self.scanned = True
+            if added or changed or removed:
+                self.entries = entries
+                self._invalidate()
+                await asyncio.to_thread(self.save)
+                for listener in self._listeners:
+                    try:
+                        listener(added, changed, removed)
+                    except Exception as e:
+                        print(f"Library listener failed: {e}")
+        return {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+    async def ensure_scanned(self):
+        if not self.scanned and not self.entries:
+            await self.rescan()
+
+    def subscribe(self, listener: Callable):
+        self._listeners.append(listener)
+
+    def start(self):
+        if self._task is None and self.music_dir is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        await self.rescan()
+        if self.watch:
+            async for _ in awatch(self.music_dir, recursive=False):
+                await self.rescan()
+        else:
+            while True:
+                await asyncio.sleep(self.rescan_interval)
+                await self.rescan()
+
+    # Queries
+
+    def _invalidate(self):
+        self._sorted = {}
+        by_name = self.sorted_by("name")
+        self._folded_names = [track.name.casefold() for track in by_name]
+        self.refresh_search()
+
+    def refresh_search(self):
+        by_name = self.sorted_by("name")
+        if self.search_text is None:
+            self._folded_search = self._folded_names
+        else:
+            self._folded_search = [self.search_text(track).casefold() for track in by_name]
+
+    def sorted_by(self, sort: str = "name") -> List[TrackDescriptor]:
+        if sort not in self._sorted:
+            if sort == "name":
+                key = lambda track: track.name.casefold()
+            else:
+                key = lambda track: getattr(track, sort)
+            self._sorted[sort] = sorted(self.entries.values(), key=key)
+        return self._sorted[sort]
+
+    def tracks(self) -> List[TrackDescriptor]:
+        return list(self.sorted_by("name"))
+
+    def get(self, name: str) -> Optional[TrackDescriptor]:
+        return self.entries.get(name)
+
+    def query(
+        self,
+        search: Optional[str] = None,
+        match: str = "substring",
+        sort: str = "name",
+        descending: bool = False,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ):
+        """Return ``(total, page)`` for a filtered, sorted slice of the library."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        if match not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {match}")
+
+        if search:
+            needle = search.casefold()
+            by_name = self.sorted_by("name")
+            if match == "prefix":
+                # Names are kept sorted, so a prefix is one contiguous range
+                start = bisect.bisect_left(self._folded_names, needle)
+                end = bisect.bisect_left(self._folded_names, needle + "\uffff")
+                results = by_name[start:end]
+            else:
+                results = [
+                    track
+                    for track, folded in zip(by_name, self._folded_search)
+                    if needle in folded
+                ]
+            if sort != "name":
+                results = sorted(results, key=lambda track: getattr(track, sort))
+        else:
+            results = self.sorted_by(sort)
+
+        if descending:
+            results = results[::-1]
+        total = len(results)
+        end = None if limit is None else offset + limit
+        return total, results[offset:end]
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+import wave
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import mutagen
+except ImportError:  # wav files still get duration and sample rate
+    mutagen = None
+
+from .library import LibraryIndex, TrackDescriptor
+from .workers import WorkerPool
+
+HASH_CHUNK_SIZE = 1 << 20
+TAG_FIELDS = ("title", "artist", "album")
+COLUMNS = (
+    "path", "mtime", "size", "title", "artist", "album",
+    "duration", "sample_rate", "channels", "content_hash", "extracted_at",
+)
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_metadata(path: str) -> Dict:
+    """Read tags, duration, sample rate and a content hash for one file."""
+    info = {field: None for field in TAG_FIELDS}
+    info.update(duration=None, sample_rate=None, channels=None)
+
+    if mutagen is not None:
+        audio = mutagen.File(path, easy=True)
+        if audio is not None:
+            tags = audio.tags or {}
+            for field in TAG_FIELDS:
+                values = tags.get(field)
+                if values:
+                    info[field] = str(values[0])
+            if audio.info is not None:
+                info["duration"] = getattr(audio.info, "length", None)
+                info["sample_rate"] = getattr(audio.info, "sample_rate", None)
+                info["channels"] = getattr(audio.info, "channels", None)
+    elif path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as wav:
+            info["sample_rate"] = wav.getframerate()
+            info["channels"] = wav.getnchannels()
+            info["duration"] = wav.getnframes() / float(wav.getframerate())
+
+    info["content_hash"] = content_hash(path)
+    return info
+
+
+class MetadataCache:
+    """Tag/duration/hash cache for the music library, backed by SQLite.
+
+    Rows are keyed by path and are only trusted while the file's mtime still
+    matches. Everything the dashboard needs is served from the in-memory copy
+    of the table; extraction happens in the shared worker pool and is fed by
+    library change notifications, so each file is read once.
+    """
+
+    def __init__(
+        self,
+        library: LibraryIndex,
+        db_path: Path,
+        pool: WorkerPool,
+        batch_size: int = 32,
+    ):
+        self.library = library
+        self.db_path = Path(db_path)
+        self.pool = pool
+        self.batch_size = batch_size
+        self.rows: Dict[str, Dict] = {}
+        self.extracted = 0
+        self.failed = 0
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued = set()
+        self._task: Optional[asyncio.Task] = None
+        self.init_db()
+        library.subscribe(self._on_library_change)
+        library.search_text = self.search_text
+        library.refresh_search()
+
+    # Storage
+
+    def connect(self) -> sqlite3.Connection:
+        """A connection to the music database; other track caches keep their tables here too."""
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def init_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self.connect()
+        try:
+            connection.execute("""
+            CREATE TABLE IF NOT EXISTS track_metadata (
+                path TEXT PRIMARY KEY,
+                mtime REAL,
+                size INTEGER,
+                title TEXT,
+                artist TEXT,
+                album TEXT,
+                duration REAL,
+                sample_rate INTEGER,
+                channels INTEGER,
+                content_hash TEXT,
+                extracted_at REAL
+            )""")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_track_metadata_hash ON track_metadata (content_hash)"
+            )
+            connection.commit()
+            cursor = connection.execute(f"SELECT {', '.join(COLUMNS)} FROM track_metadata")
+            self.rows = {row[0]: dict(zip(COLUMNS, row)) for row in cursor.fetchall()}
+        finally:
+            connection.close()
+
+    def _write(self, rows: List[Dict]):
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO track_metadata ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    [tuple(row[column] for column in COLUMNS) for row in rows],
+                )
+        finally:
+            connection.close()
+
+    def _delete(self, paths: List[str]):
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "DELETE FROM track_metadata WHERE path = ?", [(path,) for path in paths]
+                )
+        finally:
+            connection.close()
+
+    # Lookups (hot path, memory only)
+
+    def get(self, track: TrackDescriptor) -> Optional[Dict]:
+        row = self.rows.get(track.path)
+        if row is None or row["mtime"] != track.mtime:
+            return None
+        return row
+
+    def summary(self, track: TrackDescriptor) -> Dict:
+        summary = track.summary()
+        row = self.get(track)
+        if row is not None:
+            if row["title"]:
+                summary["title"] = row["title"]
+            for field in ("artist", "album", "duration"):
+                if row[field] is not None:
+                    summary[field] = row[field]
+        return summary
+
+    def search_text(self, track: TrackDescriptor) -> str:
+        row = self.get(track)
+        if row is None:
+            return track.name
+        return " ".join(
+            value for value in (track.name, row["title"], row["artist"], row["album"]) if value
+        )
+
+    def subscribe(self, listener: Callable[[List[Dict]], None]):
+        self._listeners.append(listener)
+
+    # Extraction
+
+    def enqueue(self, tracks: Iterable[TrackDescriptor]):
+        for track in tracks:
+            if track.path not in self._queued and self.get(track) is None:
+                self._queued.add(track.path)
+                self._queue.put_nowait(track)
+
+    def _on_library_change(self, added, changed, removed):
+        self.enqueue(added)
+        self.enqueue(changed)
+        gone = [track.path for track in removed if track.path in self.rows]
+        if gone:
+            for path in gone:
+                del self.rows[path]
+            asyncio.create_task(asyncio.to_thread(self._delete, gone))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        await self.library.ensure_scanned()
+        self.enqueue(self.library.tracks())
+
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            results = await asyncio.gather(
+                *(self.pool.run(extract_metadata, track.path) for track in batch),
+                return_exceptions=True,
+            )
+
+            rows = []
+            for track, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.failed += 1
+                    print(f"Metadata extraction failed for {track.name}: {result!r}")
+                    continue
+                rows.append(
+                    dict(
+                        result,
+                        path=track.path,
+                        mtime=track.mtime,
+                        size=track.size,
+                        extracted_at=time.time(),
+                    )
+                )
+
+            if rows:
+                await asyncio.to_thread(self._write, rows)
+                for row in rows:
+                    self.rows[row["path"]] = row
+                self.extracted += len(rows)
+                self.library.refresh_search()
+                for listener in self._listeners:
+                    listener(rows)
+            # Only now, so drain() can't return before listeners have run
+            for track in batch:
+                self._queued.discard(track.path)
+
+    async def drain(self):
+        """Wait until everything queued so far has been extracted."""
+        while self._queued:
+            await asyncio.sleep(0.5)
+
+    def stats(self) -> Dict:
+        return {
+            "cached": len(self.rows),
+            "pending": self._queue.qsize(),
+            "extracted": self.extracted,
+            "failed": self.failed,
+            "workers": self.pool.workers,
+        }
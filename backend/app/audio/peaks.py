@@ -0,0 +1,114 @@
+import os
+import struct
+import subprocess
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+PEAKS_MAGIC = b"PEAK"
+PEAKS_VERSION = 1
+PEAKS_SUFFIX = ".peaks"
+ANALYSIS_SAMPLE_RATE = 22050
+BASE_SAMPLES_PER_BIN = 128
+MIN_LEVEL_BINS = 256
+# magic, version, level count, sample rate, base samples/bin, total samples
+HEADER = struct.Struct("<4sBBIIQ")
+
+
+def decode_pcm(path: str, ffmpeg: Optional[str] = None):
+    """Mono float32 samples in [-1, 1] and their sample rate.
+
+    16-bit WAV (which is what the transcode cache holds) is read directly;
+    anything else is decoded through ffmpeg.
+    """
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as wav:
+                if wav.getsampwidth() == 2:
+                    channels = wav.getnchannels()
+                    frames = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+                    frames = frames.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+                    return frames / 32768.0, wav.getframerate()
+        except wave.Error:
+            pass
+
+    if ffmpeg is None:
+        raise RuntimeError(f"Can't decode {Path(path).name} without ffmpeg")
+    result = subprocess.run(
+        [
+            ffmpeg, "-nostdin", "-loglevel", "error",
+            "-i", path, "-vn",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(ANALYSIS_SAMPLE_RATE), "-",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    samples = np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+    return samples, ANALYSIS_SAMPLE_RATE
+
+
+def peak_levels(samples, samples_per_bin: int = BASE_SAMPLES_PER_BIN) -> List:
+    """Min/max peaks at successively halved resolutions, as int8 (n, 2) arrays."""
+    bins = max(1, -(-len(samples) // samples_per_bin))
+    padded = np.zeros(bins * samples_per_bin, dtype=np.float32)
+    padded[: len(samples)] = samples
+    frames = padded.reshape(bins, samples_per_bin)
+    level = np.stack([frames.min(axis=1), frames.max(axis=1)], axis=1)
+
+    levels = [level]
+    while len(level) > MIN_LEVEL_BINS:
+        if len(level) % 2:
+            level = np.concatenate([level, level[-1:]])
+        pairs = level.reshape(-1, 2, 2)
+        level = np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1)
+        levels.append(level)
+
+    return [np.clip(np.round(lvl * 127), -127, 127).astype(np.int8) for lvl in levels]
+
+
+def write_peaks(samples, sample_rate: int, destination: str) -> str:
+    """Write the multi-resolution peak file for already decoded samples."""
+    levels = peak_levels(samples)
+    tmp_path = destination + ".part"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                PEAKS_MAGIC, PEAKS_VERSION, len(levels),
+                sample_rate, BASE_SAMPLES_PER_BIN, len(samples),
+            )
+        )
+        for level in levels:
+            f.write(struct.pack("<I", len(level)))
+            f.write(level.tobytes())
+    os.replace(tmp_path, destination)
+    return destination
+
+
+def read_peaks(path: Path, min_bins: int) -> Tuple[Dict, bytes]:
+    """Pick the coarsest stored level with at least ``min_bins`` bins."""
+    with open(path, "rb") as f:
+        magic, version, level_count, sample_rate, samples_per_bin, total = HEADER.unpack(
+            f.read(HEADER.size)
+        )
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+            raise ValueError(f"Unrecognised peaks file: {path.name}")
+
+        chosen, chosen_index = None, 0
+        for index in range(level_count):
+            (count,) = struct.unpack("<I", f.read(4))
+            data = f.read(count * 2)
+            if chosen is None or count >= min_bins:
+                chosen, chosen_index = data, index
+            if count < min_bins:
+                break
+
+    info = {
+        "bins": len(chosen) // 2,
+        "samples_per_bin": samples_per_bin << chosen_index,
+        "sample_rate": sample_rate,
+        "duration": total / sample_rate if sample_rate else 0,
+    }
+    return info, chosen
@@ -0,0 +1,121 @@
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+TRACK_FIELDS = ("title", "artist", "album_title", "duration")
+
+
+def track_summary(playback_data: Optional[Dict]) -> Dict:
+    """Trim rpaudio playback data down to what the queue and header display."""
+    if not playback_data:
+        return {"title": "", "artist": ""}
+    return {key: playback_data[key] for key in TRACK_FIELDS if key in playback_data}
+
+
+class AudioStatusStream:
+    """Versioned audio player status.
+
+    Every committed change bumps ``version`` by one and is published as a
+    small ``delta`` message made of ops:
+
+    - ``{"op": "set", "key": ..., "value": ...}`` for scalar fields
+    - ``{"op": "queue_insert", "index": i, "items": [...]}``
+    - ``{"op": "queue_remove", "index": i, "count": n}``
+
+    Progress ticks are ``tick`` messages outside the version sequence. They
+    are published under the ``position`` key so the broadcaster can coalesce
+    them latest-wins for slow clients.
+
+    Clients start from a ``snapshot`` and apply deltas in order. A client that
+    sees a version gap asks for a resync and gets either the missed deltas from
+    the history ring or a fresh snapshot.
+    """
+
+    def __init__(self, publish: Callable[..., None], history: int = 256):
+        self.publish = publish
+        self.version = 0
+        self.state: Dict = {
+            "is_playing": False,
+            "current_audio": {"title": "", "artist": ""},
+            "position": None,
+            "queue": [],
+            "auto_play": False,
+            "reload_on_finish": True,
+            "volume": 1.0,
+            "effects": [],
+        }
+        self.history = deque(maxlen=history)
+        self._pending: List[Dict] = []
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            if self.state.get(key) != value:
+                self.state[key] = value
+                self._pending.append({"op": "set", "key": key, "value": value})
+
+    def position(self, value):
+        self.state["position"] = value
+
+    def tick(self, value):
+        """Publish a progress tick without bumping the version."""
+        if self.state["position"] == value:
+            return
+        self.state["position"] = value
+        self.publish(
+            {
+                "event": "audio_status",
+                "type": "tick",
+                "version": self.version,
+                "position": value,
+            },
+            "position",
+        )
+
+    def queue_insert(self, index: int, items: List[Dict]):
+        if items:
+            self.state["queue"][index:index] = items
+            self._pending.append({"op": "queue_insert", "index": index, "items": items})
+
+    def queue_remove(self, index: int, count: int = 1):
+        count = min(count, len(self.state["queue"]) - index)
+        if count > 0:
+            del self.state["queue"][index:index + count]
+            self._pending.append({"op": "queue_remove", "index": index, "count": count})
+
+    def reset_queue(self, items: List[Dict]):
+        self.queue_remove(0, len(self.state["queue"]))
+        self.queue_insert(0, list(items))
+
+    def commit(self) -> Optional[Dict]:
+        """Publish pending ops as a single delta under the next version."""
+        if not self._pending:
+            return None
+        self.version += 1
+        message = {
+            "event": "audio_status",
+            "type": "delta",
+            "version": self.version,
+            "ops": self._pending,
+        }
+        self._pending = []
+        self.history.append(message)
+        self.publish(message)
+        return message
+
+    def snapshot(self, **extra) -> Dict:
+        data = dict(self.state, queue=list(self.state["queue"]), **extra)
+        return {
+            "event": "audio_status",
+            "type": "snapshot",
+            "version": self.version,
+            "data": data,
+        }
+
+    def resync(self, since_version: Optional[int]) -> List[Dict]:
+        """Messages that bring a client at ``since_version`` up to date."""
+        if since_version is None or since_version > self.version:
+            return [self.snapshot()]
+        if since_version == self.version:
+            return []
+        if self.history and self.history[0]["version"] <= since_version + 1:
+            return [msg for msg in self.history if msg["version"] > since_version]
+        return [self.snapshot()]
@@ -0,0 +1,62 @@
+import asyncio
+from collections import deque
+from typing import Callable, Iterable, List, Optional
+
+from .library import TrackDescriptor
+
+
+class LazyTrackQueue:
+    """Sliding window over the library queue.
+
+    Only the next ``window`` tracks are materialised as sinks and pushed into
+    the rpaudio channel; everything after that stays a ``TrackDescriptor``.
+    Sinks are loaded in a worker thread so the event loop never blocks on
+    decoding, and ``fill`` tops the window back up after each track change.
+    """
+
+    def __init__(
+        self,
+        tracks: Iterable[TrackDescriptor],
+        make_sink: Callable[[TrackDescriptor], object],
+        window: int = 3,
+        on_skip: Optional[Callable[[int, TrackDescriptor], None]] = None,
+    ):
+        self.make_sink = make_sink
+        self.on_skip = on_skip
+        self.window = max(1, window)
+        self.upcoming = deque(tracks)
+        self.loaded = deque()
+        self.current: Optional[TrackDescriptor] = None
+
+    def __len__(self):
+        return len(self.loaded) + len(self.upcoming)
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.upcoming
+
+    def extend(self, tracks: Iterable[TrackDescriptor]):
+        self.upcoming.extend(tracks)
+
+    def contents(self) -> List[TrackDescriptor]:
+        return list(self.loaded) + list(self.upcoming)
+
+    async def fill(self, channel):
+        while len(self.loaded) < self.window and self.upcoming:
+            track = self.upcoming.popleft()
+            try:
+                sink = await asyncio.to_thread(self.make_sink, track)
+            except Exception as e:
+                print(f"Skipping {track.name}: {e}")
+                if self.on_skip is not None:
+                    self.on_skip(len(self.loaded), track)
+                continue
+            channel.push(sink)
+            self.loaded.append(track)
+
+    def advance(self, channel) -> int:
+        """Account for sinks the channel has consumed; returns how many."""
+        consumed = len(self.loaded) - len(channel.queue_contents)
+        for _ in range(max(0, consumed)):
+            self.current = self.loaded.popleft()
+        return max(0, consumed)
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, Optional
+
+from .library import LibraryIndex, TrackDescriptor
+from .metadata import MetadataCache
+from .workers import TrackJobs, WorkerPool
+
+CACHE_SAMPLE_RATE = 44100
+CACHE_CHANNELS = 2
+CACHE_SUFFIX = ".wav"
+
+
+def transcode_file(source: str, destination: str, ffmpeg: str = "ffmpeg"):
+    """Decode ``source`` once into 16-bit PCM WAV at the cache sample rate.
+
+    Output goes to a temp file first so a killed worker never leaves a
+    truncated file under the final name.
+    """
+    tmp_path = destination + ".part"
+    subprocess.run(
+        [
+            ffmpeg, "-nostdin", "-loglevel", "error", "-y",
+            "-i", source,
+            "-vn", "-map_metadata", "0",
+            "-acodec", "pcm_s16le",
+            "-ar", str(CACHE_SAMPLE_RATE),
+            "-ac", str(CACHE_CHANNELS),
+            "-f", "wav", tmp_path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    os.replace(tmp_path, destination)
+    return destination
+
+
+class TranscodeCache(TrackJobs):
+    """Library mirror in one uniform, cheap-to-decode format.
+
+    Every track is decoded once into PCM WAV (44.1 kHz stereo) in the worker
+    pool and stored under its content hash, so a re-tagged or replaced file
+    gets a new entry and renames cost nothing. ``resolve`` hands the audio
+    player the cached file when one is ready and the original otherwise, so
+    the pipeline can be switched on or off without touching the queue.
+    """
+
+    def __init__(
+        self,
+        metadata: MetadataCache,
+        cache_dir: Path,
+        pool: WorkerPool,
+        ffmpeg: Optional[str] = None,
+    ):
+        super().__init__(metadata, pool)
+        self.cache_dir = Path(cache_dir)
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.transcoded = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ffmpeg is not None
+
+    def cache_path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{content_hash}{CACHE_SUFFIX}"
+
+    def wants(self, row: Dict) -> bool:
+        # Files already in the cache format are served as they are
+        if (
+            row["path"].lower().endswith(CACHE_SUFFIX)
+            and row["sample_rate"] == CACHE_SAMPLE_RATE
+            and row["channels"] == CACHE_CHANNELS
+        ):
+            return False
+        return not self.cache_path(row["content_hash"]).exists()
+
+    def resolve(self, track: TrackDescriptor) -> str:
+        """Path the player should load for ``track``."""
+        row = self.metadata.get(track)
+        if row is None or not row["content_hash"]:
+            return track.path
+        cached = self.cache_path(row["content_hash"])
+        if cached.exists():
+            return str(cached)
+        return track.path
+
+    def prune(self) -> int:
+        """Delete cache files no current library track maps to."""
+        live = self.live_hashes()
+        removed = 0
+        for cached in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            if cached.stem not in live:
+                cached.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    async def idle(self):
+        # Prune once the backlog is done, not while transcodes are writing
+        await asyncio.to_thread(self.prune)
+
+    def start(self):
+        if not self.enabled:
+            print("ffmpeg not found; transcode cache disabled")
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        super().start()
+
+    async def process(self, path: str, mtime: float, content_hash: str):
+        try:
+            await self.pool.run(
+                transcode_file, path, str(self.cache_path(content_hash)), self.ffmpeg
+            )
+            self.transcoded += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Transcode failed for {Path(path).name}: {e!r}")
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._queued),
+            "transcoded": self.transcoded,
+            "failed": self.failed,
+        }
+
+
+async def transcode_library(
+    music_dir: str, data_dir: Path, workers: Optional[int] = None
+) -> Dict:
+    """Offline run: index, hash and transcode the whole library, then exit."""
+    library = LibraryIndex(music_dir, data_dir / "music_library.json", watch=False)
+    pool = WorkerPool(workers)
+    metadata = MetadataCache(library, data_dir / "music_metadata.db", pool)
+    cache = TranscodeCache(metadata, data_dir / "transcode_cache", pool)
+    await library.rescan()
+    metadata.start()
+    metadata.enqueue(library.tracks())
+    cache.start()
+    try:
+        await metadata.drain()
+        await cache.drain()
+    finally:
+        await cache.stop()
+        await metadata.stop()
+        pool.shutdown()
+    return cache.stats()
+
+
+if __name__ == "__main__":
+    import dotenv
+
+    dotenv.load_dotenv()
+    data_dir = Path(__file__).parent.parent / "data"
+    print(asyncio.run(transcode_library(os.getenv("MUSIC_DIR"), data_dir)))
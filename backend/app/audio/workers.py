@@ -0,0 +1,146 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .library import TrackDescriptor
+
+
+class WorkerPool:
+    """The one process pool every background audio job runs in.
+
+    Sized to the cores once, so metadata, transcodes and analysis share the
+    machine instead of each starting a worker per core. Functions handed to
+    ``run`` are pickled into the workers, so they must be plain top-level
+    functions.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+
+class TrackJobs(ABC):
+    """Per-content-hash work over the library, run in a shared ``WorkerPool``.
+
+    Subclasses say which metadata rows still need work (``wants``) and do it
+    for one track (``process``). Rows come from the metadata cache, at start
+    and whenever it extracts something new; at most ``pool.workers`` tracks
+    are in flight at a time.
+    """
+
+    def __init__(self, metadata, pool: WorkerPool, transcode=None):
+        self.metadata = metadata
+        self.library = metadata.library
+        self.pool = pool
+        self.transcode = transcode
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued = set()
+        self._task: Optional[asyncio.Task] = None
+        metadata.subscribe(self._on_metadata)
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    @abstractmethod
+    def wants(self, row: Dict) -> bool:
+        """Whether this metadata row still needs processing."""
+
+    @abstractmethod
+    async def process(self, path: str, mtime: float, content_hash: str):
+        """Do the work for one track."""
+
+    async def idle(self):
+        """Called whenever the queue has run dry."""
+
+    def enqueue(self, rows: Iterable[Dict]):
+        for row in rows:
+            content_hash = row["content_hash"]
+            if content_hash and content_hash not in self._queued and self.wants(row):
+                self._queued.add(content_hash)
+                self._queue.put_nowait((row["path"], row["mtime"], content_hash))
+
+    def _on_metadata(self, rows: List[Dict]):
+        if self._task is not None:
+            self.enqueue(rows)
+
+    def _current_rows(self) -> List[Dict]:
+        rows = []
+        for track in self.library.tracks():
+            row = self.metadata.get(track)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def live_hashes(self) -> set:
+        """Content hashes still in use: current library tracks and anything queued."""
+        return {row["content_hash"] for row in self._current_rows()} | self._queued
+
+    def source(self, path: str, mtime: float) -> str:
+        """File to decode for a track: its transcoded copy when there is one."""
+        if self.transcode is None:
+            return path
+        return self.transcode.resolve(TrackDescriptor(path, Path(path).name, 0, mtime))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _process(self, path: str, mtime: float, content_hash: str):
+        # One bad track must not take the whole job down with it
+        try:
+            await self.process(path, mtime, content_hash)
+        except Exception as e:
+            print(f"{type(self).__name__} failed on {Path(path).name}: {e!r}")
+        finally:
+            self._queued.discard(content_hash)
+
+    async def _idle(self):
+        try:
+            await self.idle()
+        except Exception as e:
+            print(f"{type(self).__name__} idle step failed: {e!r}")
+
+    async def _run(self):
+        await self.library.ensure_scanned()
+        self.enqueue(self._current_rows())
+        await self._idle()
+
+        running = set()
+        while True:
+            path, mtime, content_hash = await self._queue.get()
+            task = asyncio.create_task(self._process(path, mtime, content_hash))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            if len(running) >= self.pool.workers:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            if self._queue.empty():
+                await asyncio.gather(*running)
+                if self._queue.empty():
+                    await self._idle()
+
+    async def drain(self):
+        """Wait until everything queued so far has been processed."""
+        while self._queued:
+            await asyncio.sleep(0.5)
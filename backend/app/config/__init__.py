@@ -1,7 +1,4 @@
-# import the generators and generator_fuel_capacity from generator_list.py
-from .generator_list import generators, generator_fuel_capacity
+from .fleet import fleet, FleetRegistry, DEFAULT_FUEL_CAPACITY
 from .configs import image_dir
 
-# export the generators and generator_fuel_capacity
-__all__ = ['generators', 'generator_fuel_capacity', 'image_dir']
-
+__all__ = ['fleet', 'FleetRegistry', 'DEFAULT_FUEL_CAPACITY', 'image_dir']
@@ -0,0 +1,55 @@
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# gallons, unless a generator says otherwise below
+DEFAULT_FUEL_CAPACITY = 8983
+
+# (name, fuel capacity in gallons), in the order reports list them
+GENERATORS: Sequence[Tuple[str, float]] = [
+    ("GEN-A3", DEFAULT_FUEL_CAPACITY), ("GEN-A2", DEFAULT_FUEL_CAPACITY),
+    ("GEN-B3", DEFAULT_FUEL_CAPACITY), ("GEN-B2", DEFAULT_FUEL_CAPACITY),
+    ("GEN-C3", DEFAULT_FUEL_CAPACITY), ("GEN-C2", DEFAULT_FUEL_CAPACITY),
+    ("GEN-D3", DEFAULT_FUEL_CAPACITY), ("GEN-D2", DEFAULT_FUEL_CAPACITY),
+    ("GEN-R3", DEFAULT_FUEL_CAPACITY), ("GEN-R2", DEFAULT_FUEL_CAPACITY),
+    ("GEN-A1", DEFAULT_FUEL_CAPACITY), ("GEN-B1", DEFAULT_FUEL_CAPACITY),
+    ("GEN-C1", DEFAULT_FUEL_CAPACITY), ("GEN-D1", DEFAULT_FUEL_CAPACITY),
+    ("GEN-E2", DEFAULT_FUEL_CAPACITY), ("GEN-R1", DEFAULT_FUEL_CAPACITY),
+    ("GEN-H3", DEFAULT_FUEL_CAPACITY), ("GEN-I3", DEFAULT_FUEL_CAPACITY),
+    ("GEN-J3", DEFAULT_FUEL_CAPACITY), ("GEN-G3", DEFAULT_FUEL_CAPACITY),
+    ("GEN-F3", DEFAULT_FUEL_CAPACITY), ("GEN-E3", DEFAULT_FUEL_CAPACITY),
+]
+
+
+class FleetRegistry:
+    """The generators on site, in report order, with their fuel capacities.
+
+    Stored as parallel tuples (``names``, ``capacities``) plus a name to
+    position index, so charts, metrics and the database can all work in
+    positions and columns instead of per-generator objects.
+    """
+
+    def __init__(self, generators: Iterable[Tuple[str, float]]):
+        generators = list(generators)
+        self.names: Tuple[str, ...] = tuple(name for name, _ in generators)
+        self.capacities: Tuple[float, ...] = tuple(float(capacity) for _, capacity in generators)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def position(self, name: str) -> Optional[int]:
+        return self.index.get(name)
+
+    def capacity(self, name: str) -> float:
+        return self.capacities[self.index[name]]
+
+    def capacities_for(self, names: Iterable[str]) -> list:
+        return [self.capacities[self.index[name]] for name in names]
+
+
+fleet = FleetRegistry(GENERATORS)
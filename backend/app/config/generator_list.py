@@ -1,9 +0,0 @@
-generators = [
-    "GEN-A3", "GEN-A2", "GEN-B3", "GEN-B2", "GEN-C3", "GEN-C2",
-    "GEN-D3", "GEN-D2", "GEN-R3", "GEN-R2", "GEN-A1", "GEN-B1",
-    "GEN-C1", "GEN-D1", "GEN-E2", "GEN-R1", "GEN-H3", "GEN-I3",
-    "GEN-J3", "GEN-G3", "GEN-F3", "GEN-E3"
-]
-
-# gallons
-generator_fuel_capacity = 8983
@@ -0,0 +1,141 @@
+"""Fleet fuel analytics over the whole check history.
+
+Post-run fuel readings for every generator and every month are loaded once
+into flat arrays (generator index, day, fuel %), sorted by generator and
+time. Everything else is a handful of vectorised passes over those arrays,
+so forecasting from years of history costs about as much as from one month.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app.config.fleet import fleet as registry
+from app.db.db_manager import equipment_db
+from app.db.schema import DEFAULT_VALUES
+from .generator_data import FUEL_PRICE
+
+REFILL_BELOW = 80.0
+LOW_FUEL = 25.0
+
+
+class FleetFuel:
+    """Fuel readings for the fleet as arrays, sorted by generator then time."""
+
+    def __init__(self, names: Sequence[str], history: Dict[str, list]):
+        self.names = np.array(names)
+        index = {name: i for i, name in enumerate(names)}
+        seen, inverse = np.unique(np.array(history["generator"], dtype=str), return_inverse=True)
+        generator = np.array([index.get(name, -1) for name in seen], dtype=np.int64)[inverse]
+        # Untouched checks still at their defaults are not 0 % readings
+        untouched = (
+            (np.array(history["fuel_level"], dtype=np.float64) == DEFAULT_VALUES["fuel_level"])
+            & (np.array(history["battery_vdc"], dtype=np.float64) == DEFAULT_VALUES["battery_vdc"])
+            & (np.array(history["run_hours"], dtype=object) == DEFAULT_VALUES["run_hours"])
+        )
+        known = (generator >= 0) & ~untouched
+        generator = generator[known]
+        days = (
+            np.array(history["recorded_at"], dtype="datetime64[s]")[known].astype(np.int64) / 86400.0
+        )
+        fuel = np.array(history["fuel_level"], dtype=np.float64)[known]
+
+        order = np.lexsort((days, generator))
+        self.generator = generator[order]
+        self.days = days[order]
+        self.fuel = fuel[order]
+
+    @classmethod
+    async def load(cls, names: Sequence[str] = registry.names) -> "FleetFuel":
+        history = await equipment_db.check_history(phase="post")
+        return cls(names, history)
+
+    def __len__(self):
+        return len(self.names)
+
+    def latest(self):
+        """Latest fuel % and reading day per generator; NaN where there are none."""
+        level = np.full(len(self), np.nan)
+        as_of = np.full(len(self), np.nan)
+        if len(self.generator):
+            last = np.r_[self.generator[1:] != self.generator[:-1], True]
+            level[self.generator[last]] = self.fuel[last]
+            as_of[self.generator[last]] = self.days[last]
+        return level, as_of
+
+    def consumption_rates(self):
+        """Average fuel % burned per day for each generator.
+
+        Taken over consecutive readings of the same generator where the
+        level did not go up; intervals spanning a refuel say nothing about
+        consumption and are left out.
+        """
+        if len(self.generator) < 2:
+            return np.zeros(len(self))
+        delta_fuel = np.diff(self.fuel)
+        delta_days = np.diff(self.days)
+        owner = self.generator[1:]
+        usable = (owner == self.generator[:-1]) & (delta_fuel <= 0) & (delta_days > 0)
+        burned = np.bincount(owner[usable], weights=-delta_fuel[usable], minlength=len(self))
+        elapsed = np.bincount(owner[usable], weights=delta_days[usable], minlength=len(self))
+        return np.divide(burned, elapsed, out=np.zeros(len(self)), where=elapsed > 0)
+
+
+def fleet_forecast(
+    fleet: FleetFuel,
+    days: float = 30.0,
+    threshold: float = LOW_FUEL,
+    refill_below: float = REFILL_BELOW,
+    capacity=None,
+    price: float = FUEL_PRICE,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """Where the fleet's fuel stands today and ``days`` from now.
+
+    ``capacity`` is gallons per generator, a scalar or one per generator;
+    by default each generator's capacity from the fleet registry.
+    Generators with no readings are reported with ``None`` values and left
+    out of the fleet totals.
+    """
+    now = now or datetime.now()
+    today = np.datetime64(now, "s").astype(np.int64) / 86400.0
+    if capacity is None:
+        capacity = registry.capacities_for(fleet.names.tolist())
+    capacity = np.broadcast_to(np.asarray(capacity, dtype=np.float64), (len(fleet),))
+
+    level, as_of = fleet.latest()
+    rate = fleet.consumption_rates()
+    has_data = ~np.isnan(level)
+
+    current = np.clip(level - rate * np.maximum(today - as_of, 0), 0, 100)
+    forecast = np.clip(current - rate * days, 0, 100)
+    days_to_threshold = np.where(
+        rate > 0, np.maximum(current - threshold, 0) / np.where(rate > 0, rate, 1), np.inf
+    )
+    fill_gallons = np.where(has_data, (100 - current) / 100 * capacity, 0)
+    forecast_gallons = np.where(has_data, (100 - forecast) / 100 * capacity, 0)
+
+    def column(values):
+        return [
+            None if not ok or not np.isfinite(value) else round(float(value), 2)
+            for ok, value in zip(has_data, values)
+        ]
+
+    return {
+        "days": days,
+        "generators": fleet.names.tolist(),
+        "level": column(current),
+        "forecast_level": column(forecast),
+        "consumption_per_day": column(rate),
+        "days_to_threshold": column(days_to_threshold),
+        "below_refill": fleet.names[has_data & (current < refill_below)].tolist(),
+        "below_refill_forecast": fleet.names[has_data & (forecast < refill_below)].tolist(),
+        "fleet": {
+            "capacity": float(capacity[has_data].sum()),
+            "current_fuel": float((current * capacity / 100)[has_data].sum()),
+            "fill_gallons": float(fill_gallons.sum()),
+            "fill_cost": float(fill_gallons.sum() * price),
+            "forecast_fill_gallons": float(forecast_gallons.sum()),
+            "forecast_fill_cost": float(forecast_gallons.sum() * price),
+        },
+    }
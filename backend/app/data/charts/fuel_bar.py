@@ -1,36 +1,36 @@
 import plotly.graph_objects as go
-from .generator_data import FUEL_CAPACITY
+from .generator_data import FleetView
 
 
-def create_bullet_chart(gen_data):
+def create_bullet_chart(view: FleetView):
     fig = go.Figure()
-    sorted_generators = reversed(sorted(gen_data, key=lambda gen: (
-        gen.fuelInput / 100) * gen.capacity))
+    # Fullest first
+    order = view.estimated_fill.argsort(kind='stable')[::-1]
+    names = view.names[order].tolist()
+    top = float(view.capacity.max()) if len(view) else 0.0
 
-    for gen in sorted_generators:
-        # Add the range bar (background)
-        fig.add_trace(go.Bar(
-            y=[gen.capacity],
-            x=[gen.name],
-            orientation='v',
-            marker=dict(color='rgb(211,211,211)'),
-            width=0.5,
-        ))
+    # Range bars (background)
+    fig.add_trace(go.Bar(
+        y=view.capacity[order].tolist(),
+        x=names,
+        orientation='v',
+        marker=dict(color='rgb(211,211,211)'),
+        width=0.5,
+    ))
 
-        # Add the measure bar (fuel level)
-        fig.add_trace(go.Bar(
-            y=[gen.estimatedFill],
-            x=[gen.name],
-            orientation='v',
-            marker=dict(color=gen.fuel_color),
-            width=0.5,
-        ))
+    # Measure bars (fuel level)
+    fig.add_trace(go.Bar(
+        y=view.estimated_fill[order].tolist(),
+        x=names,
+        orientation='v',
+        marker=dict(color=view.fuel_colors[order].tolist()),
+        width=0.5,
+    ))
 
     fig.update_layout(
         barmode='overlay',
         yaxis=dict(
-            tickvals=[0, FUEL_CAPACITY * 0.25, FUEL_CAPACITY *
-                      0.5, FUEL_CAPACITY * 0.75, FUEL_CAPACITY],
+            tickvals=[0, top * 0.25, top * 0.5, top * 0.75, top],
             ticktext=['0%', '25%', '50%', '75%', '100%']
         ),
         margin=dict(t=25, b=25, l=36, r=36),  # Match PDF margins
@@ -46,8 +46,8 @@ def create_bullet_chart(gen_data):
     # Add target line and annotation
     fig.add_shape(
         type='line',
-        y0=(FUEL_CAPACITY * 0.8),
-        y1=(FUEL_CAPACITY * 0.8),
+        y0=(top * 0.8),
+        y1=(top * 0.8),
         x0=0,
         x1=1,
         xref='paper',
@@ -55,7 +55,7 @@ def create_bullet_chart(gen_data):
     )
 
     fig.add_annotation(
-        y=(FUEL_CAPACITY * 0.8),
+        y=(top * 0.8),
         x=1,  # Moved annotation closer to chart
         xref='paper',
         text='(80%)',
@@ -1,44 +1,62 @@
-from app.db.db_manager import DatabaseManager
-from app.config.generator_list import generators
-
-FUEL_CAPACITY = 8983
-
-class Generator:
-    def __init__(self, name, fuelInput):
-        self.name = name
-        self.fuelInput = fuelInput
-        self.capacity = FUEL_CAPACITY
-        self.estimatedFill = round(self.fuelInput / 100 * self.capacity)
-        self.fuel_color = self.get_fuel_color()
-
-    def get_fuel_color(self):
-        if self.fuelInput <= 25:
-            return 'rgb(255,0,0)'  # Red
-        elif 25 < self.fuelInput <= 75:
-            return 'rgb(255,255,0)'  # Yellow
-        else:
-            return 'rgb(0,128,0)'  # Green
-
-def get_generator_data(month="december"):
-    db_manager = DatabaseManager()
-    raw_gen_data = {gen: db_manager.get_gen_data(month=month, generator=gen)['post'] for gen in generators}
-    
-    gen_data = []
-    for gen in raw_gen_data.keys():
-        if raw_gen_data[gen]['fuel_level'] != 0:
-            gen_data.append(Generator(gen, raw_gen_data[gen]['fuel_level']))
-    
-    return gen_data
-
-def calculate_fuel_metrics(gen_data):
-    total_capacity = sum(FUEL_CAPACITY for gen in gen_data)
-    total_current_fuel = sum((gen.fuelInput / 100) * FUEL_CAPACITY for gen in gen_data)
+from typing import Dict, Iterable
+
+import numpy as np
+
+from app.db.db_manager import equipment_db
+from app.config.fleet import fleet
+
+FUEL_PRICE = 4.25  # per gallon
+FUEL_COLORS = np.array(['rgb(255,0,0)', 'rgb(255,255,0)', 'rgb(0,128,0)'])  # red, yellow, green
+
+
+class FleetView:
+    """Fuel readings for part of the fleet as parallel arrays.
+
+    ``positions`` index into the fleet registry; ``names``, ``capacity``
+    and ``fuel`` (percent) line up with them. Derived columns are computed
+    for the whole view at once.
+    """
+
+    def __init__(self, positions: Iterable[int], fuel: Iterable[float]):
+        self.positions = np.fromiter(positions, dtype=np.int64)
+        self.fuel = np.fromiter(fuel, dtype=np.float64)
+        self.names = np.asarray(fleet.names)[self.positions]
+        self.capacity = np.asarray(fleet.capacities, dtype=np.float64)[self.positions]
+
+    @classmethod
+    def from_levels(cls, fuel_levels: Dict[str, float]) -> "FleetView":
+        """Registry-ordered view of the generators with a non-zero reading."""
+        positions = [i for i, name in enumerate(fleet.names) if fuel_levels.get(name, 0) != 0]
+        return cls(positions, (fuel_levels[fleet.names[i]] for i in positions))
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def estimated_fill(self):
+        """Gallons on hand per generator."""
+        return np.round(self.fuel / 100 * self.capacity)
+
+    @property
+    def fuel_colors(self):
+        # <= 25 red, <= 75 yellow, otherwise green
+        return FUEL_COLORS[np.digitize(self.fuel, [25, 75], right=True)]
+
+
+async def get_generator_data(month="december") -> FleetView:
+    data = await equipment_db.fleet_data(month, phase='post')
+    return FleetView.from_levels(dict(zip(data['generator'], data['fuel_level'])))
+
+
+def calculate_fuel_metrics(view: FleetView):
+    total_capacity = float(view.capacity.sum())
+    total_current_fuel = float((view.fuel / 100 * view.capacity).sum())
     total_fuel_delta = total_capacity - total_current_fuel
-    estimated_cost_to_fill = total_fuel_delta * 4.25
-    
+    estimated_cost_to_fill = total_fuel_delta * FUEL_PRICE
+
     return {
         'total_capacity': total_capacity,
         'total_current_fuel': total_current_fuel,
         'total_fuel_delta': total_fuel_delta,
         'estimated_cost_to_fill': estimated_cost_to_fill
-    }
\ No newline at end of file
+    }
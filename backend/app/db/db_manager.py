@@ -1,274 +1,525 @@
+import asyncio
+import functools
+import queue
 import sqlite3
+import threading
 from pathlib import Path
-from datetime import datetime
-from ..config.generator_list import generators
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+from ..config.fleet import fleet
+from .schema import (
+    DEFAULT_VALUES, KEY_COLUMNS, MONTHS, PHASE_COLUMNS, POST_COLUMNS,
+    PRE_COLUMNS, backfill_completion, backfill_history, check_values, create_schema,
+    is_completed, month_number,
+)
+from .migrate import migrate_legacy
 import os
-from pathlib import Path
+
+
+def pooled(method):
+    """Run ``method`` with a pooled connection checked out for this thread.
+
+    Nested calls on the same thread reuse the connection they already hold.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self._local, "connection", None) is not None:
+            return method(self, *args, **kwargs)
+        connection = self._pool.get()
+        self._local.connection = connection
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._local.connection = None
+            self._pool.put(connection)
+    return wrapper
+
 
 class DatabaseManager:
-    def __init__(self):
+    """Generator pre/post run checks, one row per (year, month, generator, phase).
+
+    Checks that were never filled in have no row; reads return the default
+    values for them. Reads that don't name a year use the most recent year
+    with any checks for that month.
+
+    ``pool_size`` connections are opened in WAL mode and shared between
+    threads, so reads carry on while a save is being written. The methods
+    are blocking; async code goes through ``AsyncDatabaseManager``.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, pool_size: int = 1):
         base_dir = Path(os.path.dirname(os.path.abspath(__file__))).parent
         self.data_dir = base_dir / "data"
         self.data_dir.mkdir(exist_ok=True)
-        self.current_db = self.data_dir / "equipment_check.db"
-        self.connection = None
-        self.months = ['january', 'february', 'march', 'april', 'may', 'june',
-                      'july', 'august', 'september', 'october', 'november', 'december']
-        self.available_tables = []
-        self.gen_names = [
-            "GEN-A3", "GEN-A2", "GEN-B3", "GEN-B2", "GEN-C3", "GEN-C2",
-            "GEN-D3", "GEN-D2", "GEN-R3", "GEN-R2", "GEN-A1", "GEN-B1",
-            "GEN-C1", "GEN-D1", "GEN-E2", "GEN-R1", "GEN-H3", "GEN-I3",
-            "GEN-J3", "GEN-G3", "GEN-F3", "GEN-E3"
-        ]
-        self.pre_columns = ["fuel_level", "battery_vdc", "run_hours", "coolant_temp", "leaks", "oil_check", "notes", "last_updated"]
-        self.post_columns = ["fuel_level", "battery_vdc", "run_hours", "coolant_temp", "leaks", "notes", "last_updated"]
+        self.current_db = db_path or self.data_dir / "equipment_check.db"
+        self.pool_size = max(1, pool_size)
+        self.months = MONTHS
+        self.gen_names = list(fleet.names)
+        self.pre_columns = PRE_COLUMNS
+        self.post_columns = POST_COLUMNS
+        self.columns: List[str] = []
+        self.history_columns: List[str] = []
+        self._connections: List[sqlite3.Connection] = []
+        self._pool: queue.Queue = queue.Queue()
+        self._local = threading.local()
         self.init_db()
 
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self._local.connection
+
     def init_db(self):
-        """Initialize SQLite database connection and tables."""
-        self.connection = sqlite3.connect(self.current_db)
-        cursor = self.connection.cursor()
-        
-        # Get list of tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        self.available_tables = [table[0] for table in cursor.fetchall()]
-        
-        if not self.available_tables:
-            for month in self.months:
-                for generator in generators:
-                    gen_safe = generator.replace('-', '_').lower()
-                    
-                    # Create pre-run table
-                    cursor.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {month}_{gen_safe}_pre (
-                        fuel_level INTEGER,
-                        battery_vdc REAL,
-                        run_hours TEXT,
-                        coolant_temp TEXT,
-                        leaks BOOLEAN,
-                        oil_check BOOLEAN,
-                        notes TEXT,
-                        last_updated DATE
-                    )""")
-                    
-                    # Create post-run table
-                    cursor.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {month}_{gen_safe}_post (
-                        fuel_level INTEGER,
-                        battery_vdc REAL,
-                        run_hours TEXT,
-                        coolant_temp TEXT,
-                        leaks BOOLEAN,
-                        notes TEXT,
-                        last_updated DATE
-                    )""")
-                    
-                    # Insert initial empty row for each table
-                    cursor.execute(f"""
-                    INSERT INTO {month}_{gen_safe}_pre 
-                    (fuel_level, battery_vdc, run_hours, coolant_temp, leaks, oil_check, notes, last_updated)
-                    VALUES (0, 0.0, '0:0', '', 0, 0, '', CURRENT_DATE)
-                    """)
-                    
-                    cursor.execute(f"""
-                    INSERT INTO {month}_{gen_safe}_post
-                    (fuel_level, battery_vdc, run_hours, coolant_temp, leaks, notes, last_updated)
-                    VALUES (0, 0.0, '0:0', '', 0, '', CURRENT_DATE)
-                    """)
-            
-            self.connection.commit()
-            
-            # Update available tables list
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            self.available_tables = [table[0] for table in cursor.fetchall()]
+        """Open the database, creating the table and converting old-layout tables."""
+        for _ in range(self.pool_size):
+            connection = sqlite3.connect(self.current_db, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._connections.append(connection)
+        connection = self._connections[0]
+        create_schema(connection)
+        migrated = migrate_legacy(connection)
+        if migrated:
+            print(f"Migrated {migrated} generator checks to generator_checks")
+        backfill_completion(connection)
+        backfill_history(connection)
+        # Read once; every query below selects these by name
+        self.columns = [
+            column[1]
+            for column in connection.execute("PRAGMA table_info(generator_checks)")
+            if column[1] not in KEY_COLUMNS
+        ]
+        self.history_columns = [column for column in self.columns if column != "last_updated"]
+        for connection in self._connections:
+            self._pool.put(connection)
 
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._pool = queue.Queue()
 
-    def save_check_data(self, generator: str, pre_data: dict, post_data: dict):
-        """Save pre and post run check data to database."""
-        cursor = self.connection.cursor()
-        gen_safe = generator.replace('-', '_').lower()
-        current_month = datetime.now().strftime("%B").lower()
-        # Update pre-run data
-        pre_values = (
-            int(pre_data.get('fuel_level', 0)),
-            float(pre_data.get('battery_vdc', 0.0)),
-            pre_data.get('run_hours', '0:0'),
-            pre_data.get('coolant_temp', ''),
-            bool(pre_data.get('leaks', False)),
-            bool(pre_data.get('oil_check', False)),
-            pre_data.get('notes', '')
-        )
-        
-        cursor.execute(f"""
-        UPDATE {current_month}_{gen_safe}_pre 
-        SET fuel_level=?, battery_vdc=?, run_hours=?, coolant_temp=?, leaks=?, 
-            oil_check=?, notes=?, last_updated=CURRENT_DATE
-        """, pre_values)
-        
-        # Update post-run data
-        post_values = (
-            int(post_data.get('fuel_level', 0)),
-            float(post_data.get('battery_vdc', 0.0)),
-            post_data.get('run_hours', '0:0'),
-            post_data.get('coolant_temp', ''),
-            bool(post_data.get('leaks', False)),
-            post_data.get('notes', '')
+    def _resolve_year(self, month: int, year: Optional[int]) -> int:
+        if year is not None:
+            return year
+        row = self.connection.execute(
+            "SELECT MAX(year) FROM check_completion WHERE month = ?", (month,)
+        ).fetchone()
+        return row[0] if row[0] is not None else datetime.now().year
+
+    @staticmethod
+    def _default_record(phase: str) -> tuple:
+        return tuple(DEFAULT_VALUES[column] for column in PHASE_COLUMNS[phase])
+
+    def _fetch(
+        self,
+        months: Iterable[str],
+        year: Optional[int] = None,
+        generator: Optional[str] = None,
+        phase: Optional[str] = None,
+    ) -> List[tuple]:
+        """``(month, generator, phase, *self.columns)`` rows for the given months.
+
+        One query however many months are asked for; a month without an
+        explicit year uses the latest year that has checks for it.
+        """
+        month_nums = [month_number(month) for month in months]
+        if not month_nums:
+            return []
+        query = (
+            f"SELECT month, generator, phase, {', '.join(self.columns)} FROM generator_checks AS c "
+            f"WHERE month IN ({', '.join('?' for _ in month_nums)}) "
+            "AND year = COALESCE(?, (SELECT MAX(year) FROM check_completion WHERE month = c.month))"
         )
-        
-        cursor.execute(f"""
-        UPDATE {current_month}_{gen_safe}_post 
-        SET fuel_level=?, battery_vdc=?, run_hours=?, coolant_temp=?, leaks=?, 
-            notes=?, last_updated=CURRENT_DATE
-        """, post_values)
-        
-        self.connection.commit()
-
-    def get_entries(self, month: str, generator: str):
+        params = [*month_nums, year]
+        if generator is not None:
+            query += " AND generator = ?"
+            params.append(generator)
+        if phase is not None:
+            query += " AND phase = ?"
+            params.append(phase)
+        return self.connection.execute(query + " ORDER BY month, generator, phase", params).fetchall()
+
+    def _month_rows(self, month: str, year: Optional[int], generator: Optional[str] = None):
+        """``{(generator, phase): record}`` for one month, in a single indexed query."""
+        rows = {}
+        for _, gen, phase, *values in self._fetch([month], year, generator):
+            record = dict(zip(self.columns, values))
+            rows[(gen, phase)] = tuple(record[column] for column in PHASE_COLUMNS[phase])
+        return rows
+
+    @pooled
+    def fleet_data(
+        self,
+        months: Union[str, Iterable[str]],
+        year: Optional[int] = None,
+        phase: Optional[str] = None,
+    ) -> Dict[str, list]:
+        """Every recorded check for one or more months, as columns.
+
+        Returns ``{"month": [...], "generator": [...], "phase": [...],
+        "fuel_level": [...], ...}`` with one entry per check, all lists the
+        same length. Checks never filled in are not included.
+        """
+        if isinstance(months, str):
+            months = [months]
+        rows = self._fetch(months, year, phase=phase)
+        names = ["month", "generator", "phase", *self.columns]
+        columns = list(zip(*rows)) or [() for _ in names]
+        data = {name: list(values) for name, values in zip(names, columns)}
+        data["month"] = [MONTHS[month - 1] for month in data["month"]]
+        return data
+
+    @pooled
+    def save_check_data(self, generator: str, pre_data: dict, post_data: dict):
+        """Save pre and post run check data to database.
+
+        A phase passed as ``None`` or ``{}`` is left as it is.
+        """
+        phases = {'pre': pre_data, 'post': post_data}
+        self._write_checks({
+            generator: {
+                phase: check_values(phase, data) for phase, data in phases.items() if data
+            }
+        })
+
+    @pooled
+    def save_round(self, round_data: Dict[str, dict]) -> Dict:
+        """Validate and save a whole check round, all or nothing.
+
+        ``round_data`` maps each generator to ``{"pre": {...}, "post": {...}}``;
+        a phase that is left out or empty keeps whatever is already saved
+        for the month. Every generator is validated before anything is
+        written; if any fail, nothing is saved and ``errors`` lists what is
+        wrong per generator. Otherwise the round is written in one
+        transaction.
+        """
+        if not round_data:
+            return {'saved': [], 'errors': {'round': ['no checks submitted']}}
+        checks, errors = {}, {}
+        for generator, phases in round_data.items():
+            problems = []
+            if generator not in fleet:
+                problems.append(f"unknown generator {generator}")
+            if not isinstance(phases, dict):
+                problems.append("expected an object with 'pre' and 'post' checks")
+                phases = {}
+            values = {}
+            for phase in ('pre', 'post'):
+                if phases.get(phase) in (None, {}):
+                    continue
+                try:
+                    values[phase] = check_values(phase, phases[phase])
+                except ValueError as e:
+                    problems.extend(str(e).split('; '))
+            if not values and not problems:
+                problems.append("no 'pre' or 'post' check")
+            if problems:
+                errors[generator] = problems
+            else:
+                checks[generator] = values
+        if errors:
+            return {'saved': [], 'errors': errors}
+        self._write_checks(checks)
+        return {'saved': list(checks), 'errors': {}}
+
+    def _write_checks(self, checks: Dict[str, tuple]):
+        """Write ``{generator: {phase: values}}`` in one transaction.
+
+        Only the phases given are written.
+        """
+        now = datetime.now()
+        recorded_at = now.isoformat(sep=' ', timespec='seconds')
+        rows = [
+            (now.year, now.month, generator, phase, *values)
+            for generator, phases in checks.items()
+            for phase, values in phases.items()
+        ]
+        completion = [(*row[:4], is_completed(*row[4:7])) for row in rows]
+
+        with self.connection:
+            self.connection.executemany("""
+            INSERT INTO generator_checks
+            (year, month, generator, phase, fuel_level, battery_vdc, run_hours,
+             coolant_temp, leaks, oil_check, notes, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_DATE)
+            ON CONFLICT (year, month, generator, phase) DO UPDATE SET
+                fuel_level=excluded.fuel_level, battery_vdc=excluded.battery_vdc,
+                run_hours=excluded.run_hours, coolant_temp=excluded.coolant_temp,
+                leaks=excluded.leaks, oil_check=excluded.oil_check,
+                notes=excluded.notes, last_updated=excluded.last_updated
+            """, rows)
+            self.connection.executemany("""
+            INSERT INTO check_completion (year, month, generator, phase, completed, last_updated)
+            VALUES (?, ?, ?, ?, ?, CURRENT_DATE)
+            ON CONFLICT (year, month, generator, phase) DO UPDATE SET
+                completed=excluded.completed, last_updated=excluded.last_updated
+            """, completion)
+            self.connection.executemany("""
+            INSERT INTO check_history
+            (recorded_at, year, month, generator, phase, fuel_level, battery_vdc,
+             run_hours, coolant_temp, leaks, oil_check, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                # An untouched check is not a reading; keep it out of the history
+                (recorded_at, *row)
+                for row, (*_, completed) in zip(rows, completion)
+                if completed
+            ])
+
+    @pooled
+    def get_entries(self, month: str, generator: str, year: Optional[int] = None):
         """Retrieve entries for a specific month and generator."""
-        cursor = self.connection.cursor()
-        gen_safe = generator.replace('-', '_').lower()
-        
-        # Get pre-run entries
-        pre_table = f"{month}_{gen_safe}_pre"
-        cursor.execute(f"SELECT * FROM {pre_table}")
-        pre_entries = cursor.fetchall()
-        
-        cursor.execute(f"PRAGMA table_info({pre_table})")
-        pre_columns = [col[1] for col in cursor.fetchall()]
-        
-        # Get post-run entries
-        post_table = f"{month}_{gen_safe}_post"
-        cursor.execute(f"SELECT * FROM {post_table}")
-        post_entries = cursor.fetchall()
-        
-        cursor.execute(f"PRAGMA table_info({post_table})")
-        post_columns = [col[1] for col in cursor.fetchall()]
-        
+        rows = self._month_rows(month, year, generator)
         return {
-            'pre': {'columns': pre_columns, 'entries': pre_entries},
-            'post': {'columns': post_columns, 'entries': post_entries}
+            phase: {
+                'columns': PHASE_COLUMNS[phase],
+                'entries': [rows[(generator, phase)]] if (generator, phase) in rows else [],
+            }
+            for phase in ('pre', 'post')
         }
-    
-    def gen_records_month(self, month: str):
+
+    @pooled
+    def gen_records_month(self, month: str, year: Optional[int] = None):
         """Return generators if they have records for the month"""
-        generators = set() 
-        cursor = self.connection.cursor()
-        
-        # Get list of all tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-        
-        # Filter tables that start with the given month
-        for table in tables:
-            table_name = table[0]
-            if table_name.startswith(month.lower()):
-                # Extract generator name from table name (format: month_gen_x_pre/post) if the fields are not default values
-                cursor.execute(f"SELECT * FROM {table_name}")   
-                records = cursor.fetchall()
-                for record in records:
-                    # default values are (0, 0.0, '0:0', '', 0, 0, '', '2024-12-28') only check post records, the fourth field is not checked
-                    if record[0:3] != (0, 0.0, '0:0') and table_name.endswith('_post'):
-                        gen_name = table_name.split('_')[1:]
-                        # put the - back in
-                        gen_name = '-'.join(gen_name[:-1])
-                        # all caps
-                        gen_name = gen_name.upper()
-                        generators.add(gen_name)
-                
-        return list(generators)
-    
-    def get_gen_data(self, month: str, generator: str):
-        """Return the data for a specific generator and month"""
-        cursor = self.connection.cursor()
-        
-        # Get pre-run data
-        try:    
-            pre_table = f"{month}_{generator.replace('-', '_').lower()}_pre"
-            cursor.execute(f"SELECT * FROM {pre_table}")
-            pre_records = cursor.fetchall()
-            cursor.execute(f"PRAGMA table_info({pre_table})")
-            pre_columns = [col[1] for col in cursor.fetchall()]
-        except sqlite3.OperationalError as e:
-            print(f"Error getting pre-run data: {e}")
-            return None
-        
-        # Get post-run data  
-        try:
-            post_table = f"{month}_{generator.replace('-', '_').lower()}_post"
-            cursor.execute(f"SELECT * FROM {post_table}")
-            post_records = cursor.fetchall()
-            cursor.execute(f"PRAGMA table_info({post_table})")
-            post_columns = [col[1] for col in cursor.fetchall()]
-        except sqlite3.OperationalError as e:
-            print(f"Error getting post-run data: {e}")
-            return None
-
-        # Create list of dictionaries with proper column names
-        pre_data = {}
-        post_data = {}
-        
-        for record in pre_records:
-            pre_data[pre_columns[0]] = record[0]
-            pre_data[pre_columns[1]] = record[1]
-            pre_data[pre_columns[2]] = record[2]
-            pre_data[pre_columns[3]] = record[3]
-            pre_data[pre_columns[4]] = record[4]
-            pre_data[pre_columns[5]] = record[5]
-            pre_data[pre_columns[6]] = record[6]
-            
-        for record in post_records:
-            post_data[post_columns[0]] = record[0]
-            post_data[post_columns[1]] = record[1]
-            post_data[post_columns[2]] = record[2]
-            post_data[post_columns[3]] = record[3]
-            post_data[post_columns[4]] = record[4]
-            post_data[post_columns[5]] = record[5]
-            post_data[post_columns[6]] = record[6]
-            
+        month_num = month_number(month)
+        cursor = self.connection.execute("""
+        SELECT generator FROM check_completion
+        WHERE month = ? AND phase = 'post' AND completed = 1 AND year = ?
+        """, (month_num, self._resolve_year(month_num, year)))
+        return [row[0] for row in cursor.fetchall()]
 
+    @pooled
+    def month_progress(self, month: str, year: Optional[int] = None):
+        """Which generators have their pre and post checks done for the month."""
+        month_num = month_number(month)
+        year = self._resolve_year(month_num, year)
+        progress = {phase: [] for phase in ('pre', 'post')}
+        last_updated = None
+        for generator, phase, updated in self.connection.execute("""
+        SELECT generator, phase, last_updated FROM check_completion
+        WHERE month = ? AND completed = 1 AND year = ?
+        """, (month_num, year)):
+            progress[phase].append(generator)
+            last_updated = max(filter(None, (last_updated, updated)), default=None)
         return {
-            'pre': pre_data,
-            'post': post_data
+            'year': year,
+            'month': MONTHS[month_num - 1],
+            'total': len(self.gen_names),
+            'completed': progress,
+            'last_updated': last_updated,
         }
-    
-    def all_gen_data(self, month: str, completed_only: bool = False):
+
+    @pooled
+    def get_gen_data(self, month: str, generator: str, year: Optional[int] = None):
+        """Return the data for a specific generator and month"""
+        rows = self._month_rows(month, year, generator)
+        return {
+            phase: dict(zip(
+                PHASE_COLUMNS[phase],
+                rows.get((generator, phase), self._default_record(phase)),
+            ))
+            for phase in ('pre', 'post')
+        }
+
+    @pooled
+    def all_gen_data(self, month: str, completed_only: bool = False, year: Optional[int] = None):
         """Return the data for all generators and month"""
-        cursor = self.connection.cursor()
-        generators = [
-            "GEN-A3", "GEN-A2", "GEN-B3", "GEN-B2", "GEN-C3", "GEN-C2",
-            "GEN-D3", "GEN-D2", "GEN-R3", "GEN-R2", "GEN-A1", "GEN-B1",
-            "GEN-C1", "GEN-D1", "GEN-E2", "GEN-R1", "GEN-H3", "GEN-I3",
-            "GEN-J3", "GEN-G3", "GEN-F3", "GEN-E3"
-        ]
-        data = {}
+        rows = self._month_rows(month, year)
         if completed_only:
-            generators = self.gen_records_month(month)
-        for generator in generators:        
-            # Get pre-run data
-            pre_table = f"{month}_{generator.replace('-', '_').lower()}_pre"
-            cursor.execute(f"SELECT * FROM {pre_table}")
-            pre_record = cursor.fetchone()
-            cursor.execute(f"PRAGMA table_info({pre_table})")
-            pre_columns = [col[1] for col in cursor.fetchall()]
-        
-            # Get post-run data  
-            post_table = f"{month}_{generator.replace('-', '_').lower()}_post"
-            cursor.execute(f"SELECT * FROM {post_table}")
-            post_record = cursor.fetchone()
-            cursor.execute(f"PRAGMA table_info({post_table})")
-            post_columns = [col[1] for col in cursor.fetchall()]
-            data[generator] = {
-                'pre': pre_record,
-                'post': post_record
+            selected = self.gen_records_month(month, year)
+        else:
+            selected = self.gen_names
+        return {
+            generator: {
+                phase: rows.get((generator, phase), self._default_record(phase))
+                for phase in ('pre', 'post')
             }
+            for generator in selected
+        }
 
+    @pooled
+    def latest_checks(self, phase: str = 'post') -> Dict[str, dict]:
+        """The most recent check of each generator, whenever it was made."""
+        generators_sql = ', '.join('(?)' for _ in self.gen_names)
+        cursor = self.connection.execute(f"""
+        WITH fleet(generator) AS (VALUES {generators_sql})
+        SELECT recorded_at, year, month, generator, phase, {', '.join(self.history_columns)}
+        FROM check_history
+        WHERE id IN (
+            SELECT (SELECT id FROM check_history AS h
+                    WHERE h.generator = fleet.generator AND h.phase = ?
+                    ORDER BY recorded_at DESC, id DESC LIMIT 1)
+            FROM fleet
+        )""", (*self.gen_names, phase))
+        names = ['recorded_at', 'year', 'month', 'generator', 'phase', *self.history_columns]
+        return {row[3]: dict(zip(names, row)) for row in cursor.fetchall()}
 
-        return data
+    @pooled
+    def check_history(
+        self,
+        generator: Optional[str] = None,
+        phase: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Dict[str, list]:
+        """Every saved check in ``[start, end)``, oldest first, as columns.
 
+        ``start`` and ``end`` are ISO dates or timestamps. Filtering on a
+        generator uses the per-generator index, otherwise the time index.
+        """
+        conditions, params = [], []
+        if generator is not None:
+            conditions.append("generator = ?")
+            params.append(generator)
+            if phase is not None:
+                conditions.append("phase = ?")
+                params.append(phase)
+        if start is not None:
+            conditions.append("recorded_at >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("recorded_at < ?")
+            params.append(end)
+        if generator is None and phase is not None:
+            conditions.append("phase = ?")
+            params.append(phase)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        names = ['recorded_at', 'year', 'month', 'generator', 'phase', *self.history_columns]
+        rows = self.connection.execute(
+            f"SELECT {', '.join(names)} FROM check_history {where} ORDER BY recorded_at, id",
+            params,
+        ).fetchall()
+        columns = list(zip(*rows)) or [() for _ in names]
+        return {name: list(values) for name, values in zip(names, columns)}
 
+    @pooled
+    def compact_history(self, keep_days: int = 365, keep_years: Optional[int] = None) -> int:
+        """Thin out old history; returns how many checks were removed.
+
+        Checks newer than ``keep_days`` are all kept. Older ones are reduced
+        to the last check of each month per generator and phase, which is
+        all the monthly trend charts need. With ``keep_years`` set, anything
+        older than that is dropped altogether.
+        """
+        now = datetime.now()
+        cutoff = (now - timedelta(days=keep_days)).isoformat(sep=' ', timespec='seconds')
+        with self.connection:
+            removed = self.connection.execute("""
+            DELETE FROM check_history WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, recorded_at, ROW_NUMBER() OVER (
+                        PARTITION BY year, month, generator, phase
+                        ORDER BY recorded_at DESC, id DESC
+                    ) AS newest
+                    FROM check_history
+                )
+                WHERE newest > 1 AND recorded_at < ?
+            )""", (cutoff,)).rowcount
+            if keep_years is not None:
+                removed += self.connection.execute(
+                    "DELETE FROM check_history WHERE year < ?", (now.year - keep_years,)
+                ).rowcount
+        return removed
 
     def __del__(self):
-        """Ensure database connection is closed."""
-        if self.connection:
-            self.connection.close()
\ No newline at end of file
+        """Ensure database connections are closed."""
+        self.close()
+
+
+class AsyncDatabaseManager:
+    """One shared ``DatabaseManager`` for the app, usable from async code.
+
+    Opened once in the app lifespan. Each call runs in a worker thread with a
+    pooled connection, so equipment queries never block the event loop that
+    serves the websockets. While open, the check history is compacted every
+    ``compact_interval`` seconds (see ``DatabaseManager.compact_history``).
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        pool_size: int = 2,
+        compact_interval: float = 86400.0,
+        keep_days: int = 365,
+        keep_years: Optional[int] = None,
+    ):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.compact_interval = compact_interval
+        self.keep_days = keep_days
+        self.keep_years = keep_years
+        self.db: Optional[DatabaseManager] = None
+        self._lock = asyncio.Lock()
+        self._compact_task: Optional[asyncio.Task] = None
+
+    async def open(self):
+        async with self._lock:
+            if self.db is None:
+                self.db = await asyncio.to_thread(DatabaseManager, self.db_path, self.pool_size)
+            if self._compact_task is None and self.compact_interval > 0:
+                self._compact_task = asyncio.create_task(self._compact_loop())
+
+    async def _compact_loop(self):
+        while True:
+            try:
+                removed = await self.compact_history(self.keep_days, self.keep_years)
+                if removed:
+                    print(f"Compacted {removed} old generator checks")
+            except sqlite3.Error as e:
+                print(f"Check history compaction failed: {e!r}")
+            await asyncio.sleep(self.compact_interval)
+
+    async def close(self):
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            self._compact_task = None
+        if self.db is not None:
+            db, self.db = self.db, None
+            await asyncio.to_thread(db.close)
+
+    async def _call(self, method: str, *args, **kwargs):
+        if self.db is None:
+            await self.open()
+        return await asyncio.to_thread(getattr(self.db, method), *args, **kwargs)
+
+    async def fleet_data(self, months, year: Optional[int] = None, phase: Optional[str] = None):
+        return await self._call("fleet_data", months, year, phase)
+
+    async def save_check_data(self, generator: str, pre_data: dict, post_data: dict):
+        return await self._call("save_check_data", generator, pre_data, post_data)
+
+    async def get_entries(self, month: str, generator: str, year: Optional[int] = None):
+        return await self._call("get_entries", month, generator, year)
+
+    async def save_round(self, round_data: Dict[str, dict]):
+        return await self._call("save_round", round_data)
+
+    async def gen_records_month(self, month: str, year: Optional[int] = None):
+        return await self._call("gen_records_month", month, year)
+
+    async def month_progress(self, month: str, year: Optional[int] = None):
+        return await self._call("month_progress", month, year)
+
+    async def get_gen_data(self, month: str, generator: str, year: Optional[int] = None):
+        return await self._call("get_gen_data", month, generator, year)
+
+    async def all_gen_data(self, month: str, completed_only: bool = False, year: Optional[int] = None):
+        return await self._call("all_gen_data", month, completed_only, year)
+
+    async def latest_checks(self, phase: str = 'post'):
+        return await self._call("latest_checks", phase)
+
+    async def check_history(self, generator: Optional[str] = None, phase: Optional[str] = None,
+                            start: Optional[str] = None, end: Optional[str] = None):
+        return await self._call("check_history", generator, phase, start, end)
+
+    async def compact_history(self, keep_days: int = 365, keep_years: Optional[int] = None):
+        return await self._call("compact_history", keep_days, keep_years)
+
+
+equipment_db = AsyncDatabaseManager(
+    pool_size=int(os.getenv("EQUIPMENT_DB_POOL_SIZE", "2")),
+    compact_interval=float(os.getenv("EQUIPMENT_HISTORY_COMPACT_INTERVAL", "86400")),
+    keep_days=int(os.getenv("EQUIPMENT_HISTORY_KEEP_DAYS", "365")),
+    keep_years=int(os.getenv("EQUIPMENT_HISTORY_KEEP_YEARS", "0")) or None,
+)
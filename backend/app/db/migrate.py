@@ -0,0 +1,93 @@
+"""Convert the old per-month/per-generator tables into ``generator_checks``.
+
+The old layout had a ``{month}_{gen}_pre`` and ``{month}_{gen}_post`` table
+for every month and generator, each holding one row. Rows still at their
+seeded defaults are skipped; the rest are filed under the year of their
+``last_updated`` date. Everything happens in one transaction, and the old
+tables are dropped only once the copy succeeded, so a failed run leaves the
+database as it was. Run it directly with::
+
+    python -m app.db.migrate [path/to/equipment_check.db]
+
+``DatabaseManager`` also runs it when it opens a database that still has
+old tables.
+"""
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+from .schema import DEFAULT_VALUES, MONTHS, PHASE_COLUMNS, create_schema, month_number
+
+LEGACY_TABLE = re.compile(
+    rf"^({'|'.join(MONTHS)})_(gen_[a-z0-9_]+)_(pre|post)$"
+)
+
+
+def legacy_tables(connection: sqlite3.Connection) -> List[Tuple[str, str, str, str]]:
+    """``(table, month, generator, phase)`` for every old-layout table."""
+    tables = []
+    for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='table'"):
+        match = LEGACY_TABLE.match(name)
+        if match:
+            month, gen_safe, phase = match.groups()
+            tables.append((name, month, gen_safe.replace('_', '-').upper(), phase))
+    return tables
+
+
+def _is_default(row: dict) -> bool:
+    return all(row[column] == DEFAULT_VALUES[column] for column in ("fuel_level", "battery_vdc", "run_hours"))
+
+
+def _year_of(row: dict) -> int:
+    try:
+        return datetime.strptime(str(row["last_updated"]), "%Y-%m-%d").year
+    except ValueError:
+        return datetime.now().year
+
+
+def migrate_legacy(connection: sqlite3.Connection, drop: bool = True) -> int:
+    """Copy old-layout rows into ``generator_checks``; returns how many were kept."""
+    tables = legacy_tables(connection)
+    if not tables:
+        return 0
+    create_schema(connection)
+
+    rows = []
+    for table, month, generator, phase in tables:
+        columns = PHASE_COLUMNS[phase]
+        cursor = connection.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        for record in cursor.fetchall():
+            row = dict(zip(columns, record))
+            if _is_default(row):
+                continue
+            rows.append((_year_of(row), month_number(month), generator, phase, row))
+
+    with connection:
+        for year, month, generator, phase, row in rows:
+            columns = ["year", "month", "generator", "phase", *row]
+            connection.execute(
+                f"INSERT OR REPLACE INTO generator_checks ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                (year, month, generator, phase, *row.values()),
+            )
+        if drop:
+            for table, *_ in tables:
+                connection.execute(f"DROP TABLE {table}")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    db_path = Path(sys.argv[1]) if len(sys.argv) > 1 else (
+        Path(__file__).parent.parent / "data" / "equipment_check.db"
+    )
+    connection = sqlite3.connect(db_path)
+    try:
+        legacy = len(legacy_tables(connection))
+        migrated = migrate_legacy(connection)
+        connection.execute("VACUUM")
+        print(f"Migrated {migrated} checks from {legacy} tables in {db_path}")
+    finally:
+        connection.close()
@@ -0,0 +1,186 @@
+import re
+import sqlite3
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june',
+          'july', 'august', 'september', 'october', 'november', 'december']
+PHASES = ("pre", "post")
+KEY_COLUMNS = ("year", "month", "generator", "phase")
+
+PRE_COLUMNS = ["fuel_level", "battery_vdc", "run_hours", "coolant_temp", "leaks", "oil_check", "notes", "last_updated"]
+POST_COLUMNS = ["fuel_level", "battery_vdc", "run_hours", "coolant_temp", "leaks", "notes", "last_updated"]
+PHASE_COLUMNS = {"pre": PRE_COLUMNS, "post": POST_COLUMNS}
+CHECK_COLUMNS = PRE_COLUMNS  # every value column; post rows leave oil_check NULL
+
+# What an untouched check looks like (the old tables were seeded with these)
+DEFAULT_VALUES = {
+    "fuel_level": 0,
+    "battery_vdc": 0.0,
+    "run_hours": "0:0",
+    "coolant_temp": "",
+    "leaks": 0,
+    "oil_check": 0,
+    "notes": "",
+    "last_updated": None,
+}
+
+
+RUN_HOURS = re.compile(r"^\d+:\d{1,2}(:\d{1,2})?$")
+
+
+def whole_number(value) -> int:
+    """``int(value)``, but refusing to drop a fractional part."""
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"not a whole number: {value!r}")
+    return int(number)
+
+
+def boolean(value) -> bool:
+    """``True``/``False`` (or 1/0); anything else is refused rather than guessed."""
+    if value in (True, False) and not isinstance(value, float):
+        return bool(value)
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def check_values(phase: str, data: dict) -> tuple:
+    """Column values for one check, in ``CHECK_COLUMNS`` order minus last_updated.
+
+    Missing fields take the defaults. Raises ``ValueError`` naming every
+    bad field, separated by ``"; "``.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{phase}: missing check")
+    errors = []
+
+    def field(name, convert, valid=lambda value: True, hint=""):
+        try:
+            value = convert(data.get(name, DEFAULT_VALUES[name]))
+        except (TypeError, ValueError):
+            value = None
+        if value is None or not valid(value):
+            errors.append(f"{phase}.{name}: {hint or 'invalid value'}")
+        return value
+
+    values = (
+        field("fuel_level", whole_number, lambda v: 0 <= v <= 100, "must be a whole percentage 0-100"),
+        field("battery_vdc", float, lambda v: v >= 0, "must be a non-negative voltage"),
+        field("run_hours", str, RUN_HOURS.match, "must look like H:MM or H:MM:SS"),
+        field("coolant_temp", text),
+        field("leaks", boolean, hint="must be true or false"),
+        field("oil_check", boolean, hint="must be true or false") if phase == "pre" else None,
+        field("notes", text),
+    )
+    if errors:
+        raise ValueError("; ".join(errors))
+    return values
+
+
+def month_number(month: str) -> int:
+    try:
+        return MONTHS.index(month.lower()) + 1
+    except ValueError:
+        raise ValueError(f"Unknown month: {month}")
+
+
+def create_schema(connection: sqlite3.Connection):
+    """One row per (year, month, generator, phase) check."""
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS generator_checks (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        generator TEXT NOT NULL,
+        phase TEXT NOT NULL CHECK (phase IN ('pre', 'post')),
+        fuel_level INTEGER,
+        battery_vdc REAL,
+        run_hours TEXT,
+        coolant_temp TEXT,
+        leaks BOOLEAN,
+        oil_check BOOLEAN,
+        notes TEXT,
+        last_updated DATE,
+        PRIMARY KEY (year, month, generator, phase)
+    ) WITHOUT ROWID""")
+    # The primary key serves month views; this one serves per-generator history
+    connection.execute("""
+    CREATE INDEX IF NOT EXISTS idx_generator_checks_generator
+    ON generator_checks (generator, phase, year, month)""")
+    # Completion summary, kept up to date by every save
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS check_completion (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        generator TEXT NOT NULL,
+        phase TEXT NOT NULL CHECK (phase IN ('pre', 'post')),
+        completed BOOLEAN NOT NULL,
+        last_updated DATE,
+        PRIMARY KEY (year, month, generator, phase)
+    ) WITHOUT ROWID""")
+    connection.execute("""
+    CREATE INDEX IF NOT EXISTS idx_check_completion_month
+    ON check_completion (month, phase, completed, year)""")
+    # Every save, never overwritten; generator_checks holds the latest per month
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS check_history (
+        id INTEGER PRIMARY KEY,
+        recorded_at TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        generator TEXT NOT NULL,
+        phase TEXT NOT NULL CHECK (phase IN ('pre', 'post')),
+        fuel_level INTEGER,
+        battery_vdc REAL,
+        run_hours TEXT,
+        coolant_temp TEXT,
+        leaks BOOLEAN,
+        oil_check BOOLEAN,
+        notes TEXT
+    )""")
+    # Latest per generator and per-generator trends
+    connection.execute("""
+    CREATE INDEX IF NOT EXISTS idx_check_history_generator
+    ON check_history (generator, phase, recorded_at)""")
+    # Fleet-wide time ranges
+    connection.execute("""
+    CREATE INDEX IF NOT EXISTS idx_check_history_recorded
+    ON check_history (recorded_at)""")
+    connection.commit()
+
+
+def is_completed(fuel_level, battery_vdc, run_hours) -> bool:
+    """A check counts as done once it differs from the untouched defaults."""
+    return (fuel_level, battery_vdc, run_hours) != (
+        DEFAULT_VALUES["fuel_level"], DEFAULT_VALUES["battery_vdc"], DEFAULT_VALUES["run_hours"]
+    )
+
+
+def backfill_history(connection: sqlite3.Connection) -> int:
+    """Seed an empty history with the checks already stored, dated by last_updated."""
+    if connection.execute("SELECT 1 FROM check_history LIMIT 1").fetchone():
+        return 0
+    with connection:
+        cursor = connection.execute("""
+        INSERT INTO check_history
+        (recorded_at, year, month, generator, phase, fuel_level, battery_vdc,
+         run_hours, coolant_temp, leaks, oil_check, notes)
+        SELECT last_updated || ' 00:00:00', year, month, generator, phase, fuel_level,
+               battery_vdc, run_hours, coolant_temp, leaks, oil_check, notes
+        FROM generator_checks
+        WHERE last_updated IS NOT NULL
+          AND NOT (fuel_level = 0 AND battery_vdc = 0.0 AND run_hours = '0:0')""")
+    return cursor.rowcount
+
+
+def backfill_completion(connection: sqlite3.Connection) -> int:
+    """Add completion rows for any checks that don't have one yet."""
+    with connection:
+        cursor = connection.execute("""
+        INSERT OR IGNORE INTO check_completion (year, month, generator, phase, completed, last_updated)
+        SELECT year, month, generator, phase,
+               NOT (fuel_level = 0 AND battery_vdc = 0.0 AND run_hours = '0:0'),
+               last_updated
+        FROM generator_checks""")
+    return cursor.rowcount
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+SETTINGS_COLUMNS = ("is_muted", "message_replace", "tts_length")
+
+
+class TwitchDatabase:
+    """Shared access to the Twitch bot's ``user_economy`` database.
+
+    A few long-lived aiosqlite connections are opened once (in the router
+    lifespan) in WAL mode, so the dashboard can read while the bot writes.
+    Column names are read once at open, and user rows are served from a
+    read-through cache for ``cache_ttl`` seconds. The bot writes the same
+    table through its own connection, so entries expire rather than living
+    for the whole process; unknown users are not cached at all, so they show
+    up as soon as the bot adds them. Without a ``db_path`` there is no
+    database: lookups return None and settings are not stored.
+
+    Settings writes are write-behind: ``queue_settings`` records the latest
+    settings per user and a flush task writes everything pending in one
+    transaction every ``flush_interval`` seconds, and once more on close.
+    Until then the pending values are overlaid on every read.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str],
+        pool_size: int = 2,
+        flush_interval: float = 1.0,
+        cache_ttl: float = 5.0,
+    ):
+        self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.columns: List[str] = []
+        # username -> (fetched at, row)
+        self.cache: Dict[str, Tuple[float, Dict]] = {}
+        self.pending: Dict[str, Dict] = {}
+        self._in_flight: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.queued_writes = 0
+        self.flushed_writes = 0
+        self.flushes = 0
+        self._pool: asyncio.Queue = asyncio.Queue()
+        self._connections: List[aiosqlite.Connection] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._closing = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.db_path)
+
+    async def open(self):
+        if not self.enabled:
+            print("TWITCH_DB_PATH not set; user settings are unavailable")
+            return
+        if self._connections:
+            return
+        for _ in range(self.pool_size):
+            connection = await aiosqlite.connect(self.db_path)
+            await connection.execute("PRAGMA journal_mode=WAL")
+            await connection.execute("PRAGMA busy_timeout=5000")
+            self._connections.append(connection)
+            self._pool.put_nowait(connection)
+        async with self.acquire() as connection:
+            async with connection.execute("PRAGMA table_info(user_economy)") as cursor:
+                self.columns = [column[1] for column in await cursor.fetchall()]
+        self._closing.clear()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task is not None:
+            # Let a flush that is mid-write finish rather than cancelling it
+            self._closing.set()
+            await self._flush_task
+            self._flush_task = None
+        if self._connections:
+            await self.flush()
+        for connection in self._connections:
+            await connection.close()
+        self._connections = []
+        self._pool = asyncio.Queue()
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self.enabled:
+            raise RuntimeError("No Twitch database configured (TWITCH_DB_PATH is not set)")
+        if not self._connections:
+            await self.open()
+        connection = await self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put_nowait(connection)
+
+    def invalidate(self, username: Optional[str] = None):
+        if username is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(username, None)
+
+    async def get_user_settings(self, username: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        cached = self.cache.get(username)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        async with self.acquire() as connection:
+            async with connection.execute(
+                "SELECT * FROM user_economy WHERE username = ?", (username,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            # Not cached: the bot may add this user to the database at any time
+            return None
+        settings = dict(zip(self.columns, row))
+        # Not committed yet; the queued values are the current ones
+        settings.update(self._in_flight.get(username, {}))
+        settings.update(self.pending.get(username, {}))
+        self.cache[username] = (time.monotonic(), settings)
+        return settings
+
+    def queue_settings(self, username: str, settings: Dict):
+        """Record new settings for ``username``; written on the next flush."""
+        if not self.enabled:
+            return
+        self.pending[username] = {column: settings[column] for column in SETTINGS_COLUMNS}
+        self.queued_writes += 1
+        cached = self.cache.get(username)
+        if cached is not None:
+            cached[1].update(self.pending[username])
+
+    async def flush(self):
+        # One flush at a time, so each owns _in_flight while it writes
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+            self._in_flight = batch
+            try:
+                async with self.acquire() as connection:
+                    await connection.executemany(
+                        "UPDATE user_economy SET is_muted = ?, message_replace = ?, tts_length = ? "
+                        "WHERE username = ?",
+                        [
+                            (*(settings[column] for column in SETTINGS_COLUMNS), username)
+                            for username, settings in batch.items()
+                        ],
+                    )
+                    await connection.commit()
+            except BaseException as e:
+                # Keep anything newer that was queued while we were writing
+                self.pending = {**batch, **self.pending}
+                if not isinstance(e, Exception):
+                    raise
+                print(f"Settings flush failed, will retry: {e!r}")
+                return
+            finally:
+                self._in_flight = {}
+            self.flushed_writes += len(batch)
+            self.flushes += 1
+
+    async def _flush_loop(self):
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def update_user_settings(self, username: str, settings: Dict):
+        """Write one user's settings straight away."""
+        self.queue_settings(username, settings)
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "connections": len(self._connections),
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending_writes": len(self.pending),
+            "queued_writes": self.queued_writes,
+            "flushed_writes": self.flushed_writes,
+            "flushes": self.flushes,
+        }
@@ -1,14 +1,20 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 import uvicorn
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
 import signal
 from .websockets.endpoints import ws_router as websocket_router
+from .websockets.audio_player import library, tag_cache, track_analysis
+from .audio.peaks import read_peaks
+from .db.db_manager import equipment_db
+from .data.charts.fleet_analytics import FleetFuel, fleet_forecast
+from typing import Optional
 import sys
 
 
@@ -32,7 +38,11 @@ MUSIC_DIR = os.getenv("MUSIC_DIR")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize and clean up resources."""
-    yield
+    await equipment_db.open()
+    try:
+        yield
+    finally:
+        await equipment_db.close()
 
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -60,6 +70,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=[
+        "ETag",
+        "Accept-Ranges",
+        "Content-Range",
+        "Content-Length",
+        "X-Peaks-Bins",
+        "X-Peaks-Samples-Per-Bin",
+        "X-Peaks-Sample-Rate",
+        "X-Peaks-Duration",
+    ],
 )
 
 
@@ -67,17 +87,142 @@ app.include_router(websocket_router, prefix="/websockets")
 
 
 @app.get("/music")
-async def get_music() -> JSONResponse:
-    accepted_types = ["mp3", "wav", "mp4"]
-    audio_files = [
-        audio_file
-        for audio_file in os.listdir(MUSIC_DIR)
-        if audio_file.endswith(tuple(accepted_types))
-    ]
-    resp = {"event": "query_response", "data": audio_files}
+async def get_music(
+    q: Optional[str] = None,
+    match: str = "substring",
+    sort: str = "name",
+    order: str = "asc",
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    details: bool = False,
+) -> JSONResponse:
+    await library.ensure_scanned()
+    try:
+        total, page = library.query(
+            search=q,
+            match=match,
+            sort=sort,
+            descending=order == "desc",
+            offset=offset,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    resp = {
+        "event": "query_response",
+        "data": (
+            [
+                dict(tag_cache.summary(track), size=track.size, mtime=track.mtime)
+                for track in page
+            ]
+            if details
+            else [track.name for track in page]
+        ),
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+    }
     return JSONResponse(content=resp)
 
 
+@app.get("/music/stream")
+async def stream_music(name: str, if_none_match: Optional[str] = Header(None)):
+    """Serve one library file to browser sources.
+
+    ``FileResponse`` answers ``Range`` requests with 206 and streams the file
+    in chunks (or hands it to the server via ``pathsend`` where supported), so
+    seeking never re-reads the whole file and listeners don't hold it in memory.
+    """
+    await library.ensure_scanned()
+    # Only indexed names are served, so the path can't escape MUSIC_DIR
+    track = library.get(name)
+    if track is None:
+        raise HTTPException(status_code=404, detail=f"Unknown track: {name}")
+    try:
+        stat_result = await asyncio.to_thread(os.stat, track.path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Missing track: {name}")
+
+    response = FileResponse(
+        track.path,
+        stat_result=stat_result,
+        headers={"Cache-Control": "no-cache"},
+    )
+    if if_none_match is not None and if_none_match == response.headers.get("etag"):
+        return Response(
+            status_code=304,
+            headers={
+                "ETag": response.headers["etag"],
+                "Last-Modified": response.headers["last-modified"],
+            },
+        )
+    return response
+
+
+@app.get("/music/peaks")
+async def get_music_peaks(
+    name: str,
+    width: int = Query(1024, ge=1, le=65536),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Waveform peaks for one track as int8 ``[min, max]`` pairs.
+
+    The body is raw bytes; the bin count and timing come back in headers.
+    Responds 202 while the track is still being analysed.
+    """
+    await library.ensure_scanned()
+    track = library.get(name)
+    if track is None:
+        raise HTTPException(status_code=404, detail=f"Unknown track: {name}")
+
+    path = track_analysis.lookup(track)
+    if path is None:
+        track_analysis.request(track)
+        return JSONResponse(status_code=202, content={"status": "pending"})
+
+    etag = f'"{track_analysis.content_hash(track)}-{width}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    info, peaks = await asyncio.to_thread(read_peaks, path, width)
+    return Response(
+        content=peaks,
+        media_type="application/octet-stream",
+        headers={
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "X-Peaks-Bins": str(info["bins"]),
+            "X-Peaks-Samples-Per-Bin": str(info["samples_per_bin"]),
+            "X-Peaks-Sample-Rate": str(info["sample_rate"]),
+            "X-Peaks-Duration": f"{info['duration']:.3f}",
+        },
+    )
+
+
+@app.post("/equipment/round")
+async def save_equipment_round(checks: dict = Body(..., embed=True)) -> JSONResponse:
+    """Save a whole generator check round in one transaction.
+
+    ``checks`` maps generator names to ``{"pre": {...}, "post": {...}}``;
+    either phase may be left out. If the round is empty or any generator
+    fails validation nothing is saved and the response is 422 with the
+    problems listed per generator.
+    """
+    result = await equipment_db.save_round(checks)
+    if result["errors"]:
+        return JSONResponse(status_code=422, content=result)
+    return JSONResponse(content=result)
+
+
+@app.get("/equipment/fuel_forecast")
+async def get_fuel_forecast(
+    days: float = Query(30, ge=0, le=3650),
+    threshold: float = Query(25, ge=0, le=100),
+) -> JSONResponse:
+    """Fleet fuel today and ``days`` ahead, from every post-run check on record."""
+    fleet = await FleetFuel.load()
+    return JSONResponse(content=fleet_forecast(fleet, days=days, threshold=threshold))
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,37 +1,52 @@
 from contextlib import asynccontextmanager
-from pathlib import Path
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, APIRouter
 from fastapi.responses import HTMLResponse
 import asyncio
-from rpaudio.effects import FadeIn, FadeOut
-from rpaudio import AudioChannel, AudioSink
+import time
 import dotenv
 import os
+from pathlib import Path
+from ..audio import (
+    AudioEngine,
+    LibraryIndex,
+    MetadataCache,
+    TrackAnalysis,
+    TranscodeCache,
+    WorkerPool,
+)
+from .broadcaster import Broadcaster
 
 
 dotenv.load_dotenv()
 
 audio_processor_task = None
-client_processor_task = None
-clients = []
 
 
 @asynccontextmanager
 async def audio_router_lifespan(app: FastAPI):
     print("Audio router lifespan started")
-    global audio_processor_task, client_processor_task, clients
+    global audio_processor_task
+    library.start()
+    worker_pool.start()
+    tag_cache.start()
+    if transcode_cache is not None:
+        transcode_cache.start()
+    track_analysis.start()
     try:
         yield
     finally:
+        await track_analysis.stop()
+        if transcode_cache is not None:
+            await transcode_cache.stop()
+        await tag_cache.stop()
+        worker_pool.shutdown()
+        await library.stop()
         # Clean up tasks here
         if audio_processor_task is not None:
             audio_processor_task.cancel()
+            engine.stop()
             print("Audio processor task canceled.")
-        if client_processor_task is not None:
-            client_processor_task.cancel()
-            print("Client processor task canceled.")
-        for client in clients:
-            await client.close()
+        await broadcaster.close_all()
         print("All clients disconnected.")
 
 
@@ -40,221 +55,51 @@ audio_player_router = APIRouter(lifespan=audio_router_lifespan)
 MUSIC_DIR = os.getenv("MUSIC_DIR")
 print(MUSIC_DIR)
 
-# audio folder path object
-audio_folder_path = Path(MUSIC_DIR)
-
-
-def on_audio_stop():
-    print("Audio stopped.")
-
-
-command_queue = asyncio.Queue()
-client_queue = asyncio.Queue()
-
-
-async def create_audio_channel():
-    valid_file_types = [".mp3", ".wav", ".mp4"]
-    audio_files = [
-        str(file)
-        for file in audio_folder_path.iterdir()
-        if file.is_file() and file.suffix in valid_file_types
-    ]
-    channel = AudioChannel()
-
-    for file in audio_files:
-        audio_sink = AudioSink(callback=on_audio_stop).load_audio(file)
-        audio_sink.set_volume(1.0)
-        channel.push(audio_sink)
-
-    await asyncio.sleep(0.2)
-
-    return channel
-
-
-async def client_queue_processor():
-    while True:
-        await asyncio.sleep(0.2)
-        if not client_queue.empty():
-            audio_status = client_queue.get_nowait()
-            data = {"data": audio_status}
-            if len(clients) > 0:
-                await clients[0].send_json(data)
-
-
-async def audio_command_processor(reconnect=False):
-    player_hidden = False
-    if reconnect is False:
-        channel = None
-        audio = None
-        command = None
-        channel = await create_audio_channel()
-        print(f"channel created")
-        audio_status = {}
-        channel_1_effects = []
-        auto_play = False
-        audio_status = {}
-        reload_channel = True
-
-        if channel is not None:
-            audio_status["is_playing"] = ""
-            audio_status["queue"] = [
-                item.playback_data() for item in channel.queue_contents
-            ]
-            audio_status["data"] = None
-            audio_status["current_audio"] = ""
-
-    while True:
-        await asyncio.sleep(0.2)
-
-        try:
-            command = await asyncio.wait_for(command_queue.get(), timeout=0.2)
-
-            if command["type"] == "play":
-                if not audio_status["is_playing"]:
-                    if channel.current_audio:
-                        channel.current_audio.play()
-                        audio_status["is_playing"] = True
-
-            elif command["type"] == "pause":
-                if channel.current_audio.is_playing:
-                    channel.current_audio.pause()
-                    audio_status["is_playing"] = False
-
-            elif command["type"] == "skip":
-                if channel.current_audio:
-                    channel.current_audio.stop()
-
-            elif command["type"] == "autoplay":
-                auto_play = not auto_play
-                channel.auto_consume = auto_play
-                while channel is None:
-                    await asyncio.sleep(0.2)
-                while channel.current_audio is None:
-                    await asyncio.sleep(0.2)
-                if channel.auto_consume:
-                    channel.current_audio.play()
-                if channel is not None:
-                    audio_status["is_playing"] = channel.current_audio.is_playing
-                    audio_status["queue"] = [
-                        item.playback_data() for item in channel.queue_contents
-                    ]
-                    audio_status["data"] = None
-                    audio_status["current_audio"] = (
-                        channel.current_audio.playback_data()
-                    )
-                    audio_status["auto_play"] = auto_play
-                client_queue.put_nowait(audio_status)
-
-            elif command["type"] == "volume":
-                volume = command["volume"]["value"]
-                if channel.current_audio is not None:
-                    channel.current_audio.set_volume(float(volume))
-
-            elif command["type"] == "speed":
-                speed = command["speed"]["value"]
-                channel.current_audio.set_speed(float(speed))
-
-            elif command["type"] == "set_effects":
-                if command.get("effects") == "fade_in":
-                    channel_1_effects.append(FadeIn(duration=5.0))
-                elif command.get("effects") == "fade_out":
-                    channel_1_effects.append(FadeOut(duration=5.0))
-
-                channel.set_effects_chain(channel_1_effects)
-                client_queue.put_nowait(
-                    {"type": "set_effects", "effects": command.get("effects")}
-                )
-
-            elif command["type"] == "reload_on_finish":
-                reload_on_finish = command["reload_on_finish"]
-                reload_channel = reload_on_finish
-
-            elif command["type"] == "info_request":
-                player_hidden = False
-                if channel is not None:
-                    if channel.current_audio is not None:
-                        audio_status["is_playing"] = channel.current_audio.is_playing
-                        audio_status["current_audio"] = (
-                            channel.current_audio.playback_data()
-                        )
-                        audio_status["volume"] = channel.current_audio.get_volume()
-
-                    audio_status["queue"] = [
-                        item.playback_data() for item in channel.queue_contents
-                    ]
-                    # if an effect is FadeIn, put the string, if FadeOut, put the string, if ChangeSpeed, put the string    
-                    audio_status["effects"] = [
-                        effect.__class__.__name__ for effect in channel.effects
-                    ]
-                audio_status["auto_play"] = auto_play
-                audio_status["reload_on_finish"] = reload_channel
-                data_payload = {"event_type": "info_request", "data": audio_status}
-                client_queue.put_nowait(data_payload)
-            
-            elif command["type"] == "player_hidden":
-                player_hidden = command["player_hidden"]
-
-            else:
-                print(f"Invalid command: {command}")
-
-        except asyncio.TimeoutError:
-            await asyncio.sleep(0.2)
-
-            if channel is not None and channel.current_audio is not None and not player_hidden:
-                if channel.current_audio.is_playing:
-                    audio_status["is_playing"] = channel.current_audio.is_playing
-                    audio_status["queue"] = [
-                        item.playback_data() for item in channel.queue_contents
-                    ]
-                    audio_status["data"] = None
-                    audio_status["current_audio"] = (
-                        channel.current_audio.playback_data()
-                    )
-                    client_queue.put_nowait(audio_status)
-            elif channel is not None and len(channel.queue_contents) == 0:
-                if reload_channel:
-                    channel = await create_audio_channel()
-                    while channel is None:
-                        await asyncio.sleep(0.2)
-                    print(f"channel created")
-                    audio_status = {}
-
-                    if auto_play:
-                        channel.auto_consume = True
-                        while channel.current_audio is None:
-                            await asyncio.sleep(0.2)
-                        audio_status["is_playing"] = channel.current_audio.is_playing
-                        audio_status["queue"] = [
-                            item.playback_data() for item in channel.queue_contents
-                        ]
-                        audio_status["data"] = None
-                        audio_status["current_audio"] = (
-                            channel.current_audio.playback_data()
-                        )
-                        client_queue.put_nowait(audio_status)
-                    else:
-                        audio_status["is_playing"] = False
-                        audio_status["queue"] = [
-                            item.playback_data() for item in channel.queue_contents
-                        ]
-                        audio_status["data"] = None
-                        audio_status["current_audio"] = {
-                            "title": "",
-                            "artist": "",
-                        }
-                        client_queue.put_nowait(audio_status)
-
-                else:
-                    channel = None
-
-            if channel is None:
-                audio_status["is_playing"] = ""
-                audio_status["queue"] = []
-                audio_status["data"] = None
-                audio_status["current_audio"] = ""
-
-            if channel is None and reload_channel:
-                channel = True
+broadcaster = Broadcaster(
+    max_queue=int(os.getenv("AUDIO_WS_QUEUE_SIZE", "64")),
+    send_timeout=float(os.getenv("AUDIO_WS_SEND_TIMEOUT", "2.0")),
+    slow_client_policy=os.getenv("AUDIO_WS_SLOW_CLIENT_POLICY", "resync"),
+)
+library = LibraryIndex(
+    MUSIC_DIR,
+    index_path=Path(__file__).parent.parent / "data" / "music_library.json",
+    rescan_interval=float(os.getenv("LIBRARY_RESCAN_INTERVAL", "300")),
+    watch=os.getenv("LIBRARY_WATCH", "true").lower() == "true",
+)
+# One process pool for metadata, transcodes and track analysis
+worker_pool = WorkerPool(int(os.getenv("AUDIO_WORKERS", "0")) or None)
+tag_cache = MetadataCache(
+    library,
+    db_path=Path(__file__).parent.parent / "data" / "music_metadata.db",
+    pool=worker_pool,
+)
+transcode_cache = (
+    TranscodeCache(
+        tag_cache,
+        cache_dir=Path(__file__).parent.parent / "data" / "transcode_cache",
+        pool=worker_pool,
+    )
+    if os.getenv("TRANSCODE_CACHE", "false").lower() == "true"
+    else None
+)
+track_analysis = TrackAnalysis(
+    tag_cache,
+    pool=worker_pool,
+    peaks_dir=Path(__file__).parent.parent / "data" / "peaks_cache",
+    target=float(os.getenv("LOUDNESS_TARGET", "-14")),
+    max_boost_db=float(os.getenv("LOUDNESS_MAX_BOOST_DB", "0")),
+    transcode=transcode_cache,
+)
+engine = AudioEngine(
+    library,
+    publish=broadcaster.publish,
+    progress_interval=float(os.getenv("AUDIO_PROGRESS_INTERVAL", "0.5")),
+    prefetch=int(os.getenv("AUDIO_PREFETCH", "3")),
+    metadata=tag_cache,
+    transcode=transcode_cache,
+    loudness=track_analysis,
+)
+broadcaster.snapshot = engine.status.snapshot
 
 
 @audio_player_router.get("/audio_channels", response_class=HTMLResponse)
@@ -264,92 +109,102 @@ async def get_audio_player():
 
 @audio_player_router.websocket("/audio")
 async def websocket_endpoint(websocket: WebSocket):
-    global audio_processor_task, client_processor_task
+    global audio_processor_task
     await websocket.accept()
-    clients.append(websocket)
+    broadcaster.add(websocket)
+    broadcaster.send(websocket, engine.status.snapshot())
     if audio_processor_task is None:
-        audio_processor_task = asyncio.create_task(audio_command_processor())
-    if client_processor_task is None:
-        client_processor_task = asyncio.create_task(client_queue_processor())
+        audio_processor_task = asyncio.create_task(engine.run())
 
     try:
         while True:
-            await asyncio.sleep(0.2)
             data = await websocket.receive_json()
-            if data is not None:
-                print(f"Received data: {data}")
-
+            received_at = time.perf_counter()
             event_type = data.get("event")
             control_type = data.get("type")
-            print(f"Event type: {event_type}")
-            print(data)
-            command = data.get("data")
-            print(f"Command: {command}")
 
             if event_type == "effects":
                 effects_data = data.get("data")
-                command_queue.put_nowait(
-                    {"type": "set_effects", "effects": effects_data["effect"]}
+                engine.submit(
+                    {"type": "set_effects", "effects": effects_data["effect"]},
+                    received_at,
                 )
 
             elif event_type == "info_request":
-                command_queue.put_nowait({"type": "info_request"})
+                engine.submit({"type": "info_request"}, received_at)
+
+            elif event_type == "resync":
+                # Client saw a version gap; replay what it missed or re-snapshot
+                for message in engine.status.resync(data.get("version")):
+                    broadcaster.send(websocket, message)
 
             elif event_type == "audio_control":
                 command = data.get("data")
                 if command == "play":
-                    command_queue.put_nowait({"type": "play"})
-                    await websocket.send_json(
-                        {"event": "audio_control", "data": {"command": "play"}}
+                    engine.submit({"type": "play"}, received_at)
+                    broadcaster.send(
+                        websocket,
+                        {"event": "audio_control", "data": {"command": "play"}},
                     )
 
                 elif command == "pause":
-                    command_queue.put_nowait({"type": "pause"})
-                    await websocket.send_json(
-                        {"event": "audio_control", "data": {"command": "pause"}}
+                    engine.submit({"type": "pause"}, received_at)
+                    broadcaster.send(
+                        websocket,
+                        {"event": "audio_control", "data": {"command": "pause"}},
                     )
 
                 elif command == "skip":
-                    command_queue.put_nowait({"type": "skip"})
-                    await websocket.send_json(
-                        {"event": "audio_control", "data": {"command": "skip"}}
+                    engine.submit({"type": "skip"}, received_at)
+                    broadcaster.send(
+                        websocket,
+                        {"event": "audio_control", "data": {"command": "skip"}},
                     )
 
                 elif command == "auto_play":
-                    command_queue.put_nowait({"type": "autoplay"})
-                    await websocket.send_json(
-                        {"event": "audio_control", "data": {"command": "autoplay"}}
+                    engine.submit({"type": "autoplay"}, received_at)
+                    broadcaster.send(
+                        websocket,
+                        {"event": "audio_control", "data": {"command": "autoplay"}},
+                    )
+
+                elif command == "seek":
+                    engine.submit(
+                        {"type": "seek", "position": data["value"]},
+                        received_at,
                     )
 
                 if control_type == "volume":
                     volume = data["data"]["value"]
-                    command_queue.put_nowait(
-                        {"type": "volume", "volume": {"value": volume}}
+                    engine.submit(
+                        {"type": "volume", "volume": {"value": volume}},
+                        received_at,
                     )
 
             elif control_type == "reload_on_finish":
                 reload_on_finish = data["data"]["value"]
-                command_queue.put_nowait(
-                    {"type": "reload_on_finish", "reload_on_finish": reload_on_finish}
+                engine.submit(
+                    {"type": "reload_on_finish", "reload_on_finish": reload_on_finish},
+                    received_at,
                 )
             elif control_type == "player_hidden":
                 player_hidden = data["value"]
-                command_queue.put_nowait(
-                    {"type": "player_hidden", "player_hidden": player_hidden}
+                engine.submit(
+                    {"type": "player_hidden", "player_hidden": player_hidden},
+                    received_at,
                 )
 
-            for client in clients:
-                if client != websocket:
-                    await client.send_json(
-                        {
-                            "event": "audio_state_updated",
-                            "data": {"event_type": event_type},
-                        }
-                    )
+            broadcaster.publish(
+                {
+                    "event": "audio_state_updated",
+                    "data": {"event_type": event_type},
+                },
+                exclude=websocket,
+            )
 
     except (WebSocketDisconnect, RuntimeError):
         print("WebSocket disconnected")
-        clients.remove(websocket)
+        await broadcaster.remove(websocket)
 
     finally:
         print("WebSocket disconnected finally")
@@ -0,0 +1,168 @@
+import asyncio
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from fastapi import WebSocket
+
+SLOW_CLIENT_POLICIES = ("resync", "drop_oldest", "disconnect")
+
+
+class ClientSender:
+    """Bounded outbound queue and sender task for a single websocket.
+
+    Frames published with a ``key`` are latest-wins: a newer frame with the
+    same key replaces the pending one instead of queueing behind it.
+    """
+
+    def __init__(self, websocket: WebSocket, broadcaster: "Broadcaster"):
+        self.websocket = websocket
+        self.broadcaster = broadcaster
+        self.pending = deque()
+        self.keyed: Dict[str, list] = {}
+        self.sent = 0
+        self.coalesced = 0
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, message, key: Optional[str] = None):
+        if key is not None and key in self.keyed:
+            self.keyed[key][1] = message
+            self.coalesced += 1
+            return
+
+        if len(self.pending) >= self.broadcaster.max_queue:
+            if not self.broadcaster.handle_overflow(self):
+                return
+
+        entry = [key, message]
+        self.pending.append(entry)
+        if key is not None:
+            self.keyed[key] = entry
+        self._wakeup.set()
+
+    def clear(self):
+        self.pending.clear()
+        self.keyed.clear()
+
+    async def _run(self):
+        try:
+            while True:
+                if not self.pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                entry = self.pending.popleft()
+                key, message = entry
+                if key is not None and self.keyed.get(key) is entry:
+                    del self.keyed[key]
+                # Pre-encoded text is shared as-is across every client
+                send = (
+                    self.websocket.send_text(message)
+                    if isinstance(message, str)
+                    else self.websocket.send_json(message)
+                )
+                await asyncio.wait_for(send, timeout=self.broadcaster.send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dropping websocket client: {e!r}")
+            asyncio.create_task(self.broadcaster.remove(self.websocket, close=True))
+
+
+class Broadcaster:
+    """Fan-out of JSON frames to many websockets without blocking the publisher.
+
+    ``publish`` only enqueues; each client has its own sender task, so one slow
+    browser source can't stall the others or the code doing the publishing.
+    A ``str`` message is sent as an already-encoded text frame, so a payload
+    fanned out to many clients only has to be serialised once.
+    When a client's queue is full the ``slow_client_policy`` decides what
+    happens:
+
+    - ``resync``: drop its backlog and queue a fresh snapshot from ``snapshot``
+    - ``drop_oldest``: discard the oldest pending frame
+    - ``disconnect``: close the client
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 64,
+        send_timeout: float = 2.0,
+        slow_client_policy: str = "resync",
+        snapshot: Optional[Callable[[], Dict]] = None,
+    ):
+        if slow_client_policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy: {slow_client_policy}")
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.slow_client_policy = slow_client_policy
+        self.snapshot = snapshot
+        self.senders: Dict[WebSocket, ClientSender] = {}
+        self.dropped_clients = 0
+
+    def __len__(self):
+        return len(self.senders)
+
+    def add(self, websocket: WebSocket) -> ClientSender:
+        sender = ClientSender(websocket, self)
+        self.senders[websocket] = sender
+        return sender
+
+    async def remove(self, websocket: WebSocket, close: bool = False):
+        sender = self.senders.pop(websocket, None)
+        if sender is None:
+            return
+        if sender.task is not asyncio.current_task():
+            sender.task.cancel()
+        if close:
+            self.dropped_clients += 1
+            try:
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+
+    def publish(self, message, key: Optional[str] = None, exclude: Optional[WebSocket] = None):
+        for websocket, sender in list(self.senders.items()):
+            if websocket is not exclude:
+                sender.put(message, key)
+
+    def send(self, websocket: WebSocket, message, key: Optional[str] = None):
+        """Queue a frame for one client, ordered with its broadcast frames."""
+        sender = self.senders.get(websocket)
+        if sender is not None:
+            sender.put(message, key)
+
+    def handle_overflow(self, sender: ClientSender) -> bool:
+        """Apply the slow client policy; returns whether to still queue the frame."""
+        if self.slow_client_policy == "drop_oldest":
+            entry = sender.pending.popleft()
+            if entry[0] is not None and sender.keyed.get(entry[0]) is entry:
+                del sender.keyed[entry[0]]
+            return True
+
+        if self.slow_client_policy == "resync" and self.snapshot is not None:
+            # The backlog is stale anyway; one snapshot supersedes all of it
+            sender.clear()
+            sender.pending.append([None, self.snapshot()])
+            sender._wakeup.set()
+            return False
+
+        asyncio.create_task(self.remove(sender.websocket, close=True))
+        return False
+
+    def stats(self) -> Dict:
+        return {
+            "clients": len(self.senders),
+            "dropped_clients": self.dropped_clients,
+            "queued": sum(len(sender.pending) for sender in self.senders.values()),
+            "coalesced": sum(sender.coalesced for sender in self.senders.values()),
+        }
+
+    async def close_all(self):
+        for websocket in list(self.senders):
+            await self.remove(websocket)
+            try:
+                await websocket.close()
+            except Exception:
+                pass
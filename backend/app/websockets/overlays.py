@@ -1,7 +1,12 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, APIRouter, Body
-from typing import Dict, List
+from collections import deque
+from typing import Dict, List, Optional, Set
 import asyncio
+import json
+import os
+import uuid
+from .broadcaster import Broadcaster
 
 
 @asynccontextmanager
@@ -10,76 +15,241 @@ async def overlay_router_lifespan(app: FastAPI):
     try:
         yield
     finally:
+        await manager.stop()
         print("Overlay router shutdown complete")
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.control_panel_state: Dict[str, Dict] = {
-            "particleCount": 50,
-            "particleSpeed": 0.8,
-            "baseSize": 15,
-            "baseHue": 180,
-            "numberOfStars": 3,
-            "blackParticles": False,
-            "blackStars": False,
-            "trailLength": 5,
-            "rotationSpeed": 0.03,
-            "starSpeed": 0.02,
-            "starSize": 0.2,
-            "starOffset": 1.02,
-            "wanderStrength": 0.1,
-            "collisionForce": 0.5,
-            "trailColor": 0
+DEFAULT_SCENE = "default"
+PATCH_HISTORY = 256
+# Versions only mean something within one backend process; clients echo this
+# back so a restarted server can tell their version is from an older history
+EPOCH = uuid.uuid4().hex
+DEFAULT_STATE = {
+    "particleCount": 50,
+    "particleSpeed": 0.8,
+    "baseSize": 15,
+    "baseHue": 180,
+    "numberOfStars": 3,
+    "blackParticles": False,
+    "blackStars": False,
+    "trailLength": 5,
+    "rotationSpeed": 0.03,
+    "starSpeed": 0.02,
+    "starSize": 0.2,
+    "starOffset": 1.02,
+    "wanderStrength": 0.1,
+    "collisionForce": 0.5,
+    "trailColor": 0
+}
+
+
+class OverlayScene:
+    """One named scene: its settings and every overlay source showing it.
+
+    Settings are versioned. Each applied change bumps ``version`` and goes
+    out as ``{"type": "patch", "epoch", "version", "data": {changed keys}}``;
+    new or lagging overlays get ``{"type": "snapshot", "epoch", "version",
+    "data": state}``. Recent patches are kept so a reconnecting overlay can
+    catch up cheaply; one from another epoch always gets a snapshot.
+    """
+
+    def __init__(self, name: str, overlays: Broadcaster):
+        self.name = name
+        self.state: Dict = dict(DEFAULT_STATE)
+        self.version = 0
+        self.pending: Dict = {}
+        self.history = deque(maxlen=PATCH_HISTORY)
+        self.overlays = overlays
+        overlays.snapshot = self.snapshot
+
+    def snapshot(self) -> str:
+        return json.dumps(
+            {"type": "snapshot", "epoch": EPOCH, "version": self.version, "data": self.state}
+        )
+
+    def merge(self, patch: Dict):
+        self.pending.update(patch)
+
+    def apply(self) -> Optional[str]:
+        """Fold pending changes into the state; returns the encoded patch, if any."""
+        changes = {
+            key: value for key, value in self.pending.items() if self.state.get(key) != value
         }
+        self.pending = {}
+        if not changes:
+            return None
+        self.state.update(changes)
+        self.version += 1
+        message = json.dumps(
+            {"type": "patch", "epoch": EPOCH, "version": self.version, "data": changes}
+        )
+        self.history.append((self.version, message))
+        return message
 
-    async def connect(self, websocket: WebSocket):
-        client_connection = await websocket.receive_json()
-        self.active_connections[client_connection["client"]] = websocket
-        if client_connection["client"] == "overlay":
-            await self.broadcast_to_overlays()
+    def resync(self, since_version: Optional[int], epoch: Optional[str] = None) -> List[str]:
+        if epoch != EPOCH:
+            return [self.snapshot()]
+        if since_version == self.version:
+            return []
+        if (
+            since_version is not None
+            and self.history
+            and self.history[0][0] <= since_version + 1
+            and since_version < self.version
+        ):
+            return [message for version, message in self.history if version > since_version]
+        return [self.snapshot()]
+
+
+class ConnectionManager:
+    """Relays control panel settings to overlay browser sources, per scene.
+
+    Overlays announce the scene they render (``default`` if they don't say)
+    and any number of them can share one. The control panel picks the scene
+    each update is for and sends only the keys that changed; they are merged
+    latest-wins into that scene's pending changes, and a flush task applies
+    them at most once per frame (``frame_rate``), publishing a patch only
+    when something really differs.
+    Each patch is encoded once and the same text frame is queued on every
+    overlay's own sender, so a stalled source never holds up the rest.
+    """
 
-    def disconnect(self, websocket: WebSocket):
-        # Find and remove the client key associated with this websocket
-        for client, ws in list(self.active_connections.items()):
-            if ws == websocket:
-                del self.active_connections[client]
-                break
+    def __init__(
+        self,
+        frame_rate: float = 60.0,
+        max_queue: int = 16,
+        send_timeout: float = 2.0,
+    ):
+        self.frame_interval = 1.0 / frame_rate
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.scenes: Dict[str, OverlayScene] = {}
+        self.control_panels: Set[WebSocket] = set()
+        self.updates_received = 0
+        self.updates_sent = 0
+        self._overlay_scenes: Dict[WebSocket, OverlayScene] = {}
+        self._dirty: Set[str] = set()
+        self._changed = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
 
-    async def send_message(self, message: str, client: str):
-        if client in self.active_connections:
-            await self.active_connections[client].send_text(message)
+    @property
+    def control_panel_state(self) -> Dict:
+        return self.scene(DEFAULT_SCENE).state
+
+    def scene(self, name: str) -> OverlayScene:
+        scene = self.scenes.get(name)
+        if scene is None:
+            scene = OverlayScene(
+                name,
+                Broadcaster(max_queue=self.max_queue, send_timeout=self.send_timeout),
+            )
+            self.scenes[name] = scene
+        return scene
+
+    async def connect(self, websocket: WebSocket) -> Dict:
+        client_connection = await websocket.receive_json()
+        if client_connection.get("client") == "overlay":
+            scene = self.scene(client_connection.get("scene") or DEFAULT_SCENE)
+            scene.overlays.add(websocket)
+            # A reconnecting overlay says which version it has
+            for message in scene.resync(
+                client_connection.get("version"), client_connection.get("epoch")
+            ):
+                scene.overlays.send(websocket, message)
+            self._overlay_scenes[websocket] = scene
+        else:
+            self.control_panels.add(websocket)
+        return client_connection
+
+    async def disconnect(self, websocket: WebSocket):
+        self.control_panels.discard(websocket)
+        scene = self._overlay_scenes.pop(websocket, None)
+        if scene is not None:
+            await scene.overlays.remove(websocket)
 
     async def disconnect_all(self):
-        for client, connection in list(self.active_connections.items()):
-            await connection.close()
-            del self.active_connections[client]
+        for scene in self.scenes.values():
+            await scene.overlays.close_all()
+        self._overlay_scenes.clear()
+        for websocket in list(self.control_panels):
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        self.control_panels.clear()
+
+    def update_state(self, patch: Dict, scene: str = DEFAULT_SCENE):
+        # Latest wins per key; a full state is just a patch of every key
+        self.scene(scene).merge(patch)
+        self._dirty.add(scene)
+        self.updates_received += 1
+        self._changed.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
 
-    async def broadcast_to_overlays(self):
+    async def _flush_loop(self):
         while True:
-            await asyncio.sleep(0.5)
-            if "overlay" in self.active_connections.keys():
-                await self.active_connections["overlay"].send_json(self.control_panel_state)
+            await self._changed.wait()
+            self._changed.clear()
+            dirty, self._dirty = self._dirty, set()
+            for name in dirty:
+                self.broadcast_to_overlays(self.scenes[name])
+            # Frame cap: input arriving meanwhile coalesces into one update
+            await asyncio.sleep(self.frame_interval)
+
+    def broadcast_to_overlays(self, scene: OverlayScene):
+        message = scene.apply()
+        if message is None:
+            return
+        scene.overlays.publish(message)
+        self.updates_sent += len(scene.overlays)
+
+    def resync(self, websocket: WebSocket, since_version: Optional[int], epoch: Optional[str]):
+        scene = self._overlay_scenes.get(websocket)
+        if scene is not None:
+            for message in scene.resync(since_version, epoch):
+                scene.overlays.send(websocket, message)
+
+    def stats(self) -> Dict:
+        return {
+            "scenes": {name: len(scene.overlays) for name, scene in self.scenes.items()},
+            "control_panels": len(self.control_panels),
+            "updates_received": self.updates_received,
+            "updates_sent": self.updates_sent,
+        }
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.disconnect_all()
 
 
 overlay_router = APIRouter(lifespan=overlay_router_lifespan)
-manager = ConnectionManager()
+manager = ConnectionManager(
+    frame_rate=float(os.getenv("OVERLAY_FRAME_RATE", "60")),
+    max_queue=int(os.getenv("OVERLAY_WS_QUEUE_SIZE", "16")),
+    send_timeout=float(os.getenv("OVERLAY_WS_SEND_TIMEOUT", "2.0")),
+)
 
 
 @overlay_router.websocket("/overlay")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    await manager.connect(websocket)
     try:
+        await manager.connect(websocket)
         while True:
-            try:
-                data = await websocket.receive_json()
-                # print(data)
-                if data.get("client") == "control_panel":
-                    manager.control_panel_state = data["data"]
-                await asyncio.sleep(0.5)
-            except WebSocketDisconnect:
-                break
+            data = await websocket.receive_json()
+            if data.get("client") == "control_panel":
+                scene = data.get("scene") or DEFAULT_SCENE
+                if "patch" in data:
+                    manager.update_state(data["patch"], scene)
+                elif "data" in data:
+                    manager.update_state(data["data"], scene)
+            elif data.get("event") == "resync":
+                # Overlay saw a version gap; replay what it missed or re-snapshot
+                manager.resync(websocket, data.get("version"), data.get("epoch"))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        await manager.disconnect(websocket)
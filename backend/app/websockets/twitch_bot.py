@@ -1,98 +1,290 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, WebSocket, WebSocketDisconnect
 import asyncio
 from dotenv import load_dotenv
+import json
 import os
-import aiosqlite
+import tempfile
+from pathlib import Path
+from .broadcaster import Broadcaster
+from ..db.twitch_db import TwitchDatabase
 
 load_dotenv()
 TWITCH_DB_PATH = os.getenv("TWITCH_DB_PATH")
 
-async def get_user_settings(username):
-    async with aiosqlite.connect(TWITCH_DB_PATH) as db:
-        # get the column names
-        async with db.execute("PRAGMA table_info(user_economy)") as cursor:
-            column_names = await cursor.fetchall()
-            print(column_names)
-        async with db.execute("SELECT * FROM user_economy WHERE username = ?", (username,)) as cursor:
-            user_settings = await cursor.fetchone()
-            # dictionary with column names as keys
-            user_settings_dict = {
-                column[1]: user_settings[i] for i, column in enumerate(column_names)
-            }
-            return user_settings_dict
-
-async def update_user_settings(username, settings):
-    async with aiosqlite.connect(TWITCH_DB_PATH) as db:
-        await db.execute("UPDATE user_economy SET is_muted = ?, message_replace = ?, tts_length = ? WHERE username = ?", (settings['is_muted'], settings['message_replace'], settings['tts_length'], username))
-        await db.commit()
-        print(f"Updated settings for {username} {settings}")
-
-twitch_bot_router = APIRouter()
+twitch_db = TwitchDatabase(
+    TWITCH_DB_PATH,
+    pool_size=int(os.getenv("TWITCH_DB_POOL_SIZE", "2")),
+    flush_interval=float(os.getenv("TWITCH_SETTINGS_FLUSH_INTERVAL", "1.0")),
+    cache_ttl=float(os.getenv("TWITCH_SETTINGS_CACHE_TTL", "5.0")),
+)
+
+
+@asynccontextmanager
+async def twitch_bot_router_lifespan(app: FastAPI):
+    print("Twitch bot router lifespan started")
+    await twitch_db.open()
+    await asyncio.to_thread(manager.load_state)
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(manager.save_state)
+        await manager.web_clients.close_all()
+        await twitch_db.close()
+        print("Twitch bot router shutdown complete")
+
+
+twitch_bot_router = APIRouter(lifespan=twitch_bot_router_lifespan)
 
 
 class ConnectionManager:
-    def __init__(self):
+    """Chatter state shared between the Twitch bot and dashboard clients.
+
+    Web clients get a full ``UPDATE`` snapshot when they connect and after
+    that only ``CHATTER_DELTA`` messages (who joined, who left, whose settings
+    changed, who is speaking), pushed as soon as the bot or another client
+    reports a change. Nothing is sent while nothing changes.
+
+    The bot reports changes as ``BOT_EVENT`` messages numbered per bot
+    session. Each applied event is acknowledged; on (re)connect the bot is
+    told the last sequence we hold and replays only what came after it, or
+    sends one ``SNAPSHOT`` event if we have nothing usable (a new bot
+    session). The chatter state and sequence are saved to disk so a backend
+    restart resumes the same way. Settings meant for the bot are held while
+    it is offline and delivered when it reconnects.
+    """
+
+    def __init__(self, state_path: Path = None):
+        self.state_path = state_path
         self.twitch_bot_websocket = None
-        self.web_client_websockets = set()
-        self.send_task = None
+        self.bot_session = None
+        self.bot_seq = 0
+        self.pending_bot_messages = {}
+        self._sync_requested_at = None
+        self._save_task = None
+        self.web_clients = Broadcaster(
+            max_queue=int(os.getenv("TWITCH_WS_QUEUE_SIZE", "64")),
+            send_timeout=float(os.getenv("TWITCH_WS_SEND_TIMEOUT", "2.0")),
+            snapshot=self.snapshot,
+        )
         self.chatter_list = []
         self.current_chatter = None
         self.chatters_data = {}
-        self.update_settings = {}
+        self.deltas_sent = 0
 
-    async def connect(self, websocket: WebSocket, client_type: str):
+    @property
+    def web_client_websockets(self):
+        return set(self.web_clients.senders)
+
+    def snapshot(self):
+        return {
+            "event": "UPDATE",
+            "data": {
+                "chatter_list": self.chatter_list,
+                "current_chatter": self.current_chatter,
+                "chatters_data": self.chatters_data,
+            },
+        }
+
+    async def connect(self, websocket: WebSocket, client_type: str, session: str = None):
         if client_type == "TWITCH_BOT":
             self.twitch_bot_websocket = websocket
+            self._sync_requested_at = None
+            await self.request_sync(session)
+            # Settings changed while the bot was away, latest per user
+            pending, self.pending_bot_messages = self.pending_bot_messages, {}
+            for message in pending.values():
+                await self.send_to_bot(message)
         elif client_type == "WEB_CLIENT":
-            self.web_client_websockets.add(websocket)
-            if self.send_task is None:
-                self.send_task = asyncio.create_task(self.broadcast_chatter_list())
+            self.web_clients.add(websocket)
+            self.web_clients.send(websocket, self.snapshot())
 
     async def disconnect(self, websocket: WebSocket):
-        if websocket in self.web_client_websockets:
-            self.web_client_websockets.remove(websocket)
+        if websocket in self.web_clients.senders:
+            await self.web_clients.remove(websocket)
         elif websocket == self.twitch_bot_websocket:
             self.twitch_bot_websocket = None
 
-        if not self.web_client_websockets and self.send_task:
-            self.send_task.cancel()
-            self.send_task = None
+    def publish_delta(self, joined=None, left=None, changed=None, **fields):
+        delta = {
+            key: value
+            for key, value in (("joined", joined), ("left", left), ("changed", changed))
+            if value
+        }
+        delta.update(fields)
+        if delta:
+            self.web_clients.publish({"event": "CHATTER_DELTA", "data": delta})
+            self.deltas_sent += 1
 
-    async def broadcast_chatter_list(self):
-        while True:
-            await asyncio.sleep(2)
-            if len(self.update_settings.items()) > 0:
-                for chatter_name, settings in self.update_settings.items():
-                    await self.twitch_bot_websocket.send_json({
-                        'event': 'UPDATE_SETTINGS',
-                        'username': chatter_name,
-                        'data': settings
+    def apply_bot_update(self, data: dict):
+        """Diff a full chatter report from the bot against what we have."""
+        chatter_list = data.get("chatter_list") or []
+        chatters_data = data.get("chatters_data") or {}
+        current_chatter = data.get("current_chatter")
+
+        joined = {
+            name: chatters_data.get(name)
+            for name in chatter_list
+            if name not in self.chatters_data
+        }
+        left = [name for name in self.chatter_list if name not in chatters_data]
+        changed = {
+            name: settings
+            for name, settings in chatters_data.items()
+            if name in self.chatters_data and self.chatters_data[name] != settings
+        }
+        fields = {}
+        if current_chatter != self.current_chatter:
+            fields["current_chatter"] = current_chatter
+
+        self.chatter_list = chatter_list
+        self.chatters_data = chatters_data
+        self.current_chatter = current_chatter
+        self.publish_delta(joined, left, changed, **fields)
+        self._schedule_save()
 
-                })
-                self.update_settings = {}
-            if self.web_client_websockets:
-                print(self.chatters_data)
-                message = {
-                    "event": "UPDATE",
-                    "data": {
-                        "chatter_list": self.chatter_list,
-                        "current_chatter": self.current_chatter,
-                        "chatters_data": self.chatters_data,
-                    },
-                }
-                dead_clients = set()
+    def apply_settings(self, settings: dict, source: WebSocket = None):
+        name = settings["name"]
+        if self.chatters_data.get(name) == settings:
+            return
+        self.chatters_data[name] = settings
+        self._schedule_save()
+        self.web_clients.publish(
+            {"event": "CHATTER_DELTA", "data": {"changed": {name: settings}}},
+            exclude=source,
+        )
+        self.deltas_sent += 1
 
-                for websocket in self.web_client_websockets:
-                    try:
-                        await websocket.send_json(message)
-                    except Exception:
-                        dead_clients.add(websocket)
+    async def send_to_bot(self, message: dict):
+        if self.twitch_bot_websocket is None:
+            if message.get("event") == "UPDATE_SETTINGS":
+                self.pending_bot_messages[message["username"]] = message
+            return
+        try:
+            await self.twitch_bot_websocket.send_json(message)
+        except Exception as e:
+            print(f"Failed to reach Twitch bot: {e!r}")
+            self.twitch_bot_websocket = None
+            if message.get("event") == "UPDATE_SETTINGS":
+                self.pending_bot_messages[message["username"]] = message
+
+    # Bot sync protocol
+
+    async def request_sync(self, session: str = None):
+        """Tell the bot where to resume from; ``acked`` is None to ask for a snapshot."""
+        acked = self.bot_seq if session is not None and session == self.bot_session else None
+        await self.send_to_bot({"event": "SYNC", "acked": acked})
+
+    async def apply_bot_event(self, message: dict):
+        seq = message.get("seq")
+        event_type = message.get("type")
+        data = message.get("data") or {}
+
+        if event_type == "SNAPSHOT":
+            self.bot_session = message.get("session")
+            self.apply_bot_update(data)
+        elif message.get("session") != self.bot_session:
+            if self._sync_requested_at != "session":
+                self._sync_requested_at = "session"
+                await self.send_to_bot({"event": "SYNC", "acked": None})
+            return
+        elif seq <= self.bot_seq:
+            # Replayed after a reconnect; already applied
+            await self.send_to_bot({"event": "ACK", "seq": self.bot_seq})
+            return
+        elif seq != self.bot_seq + 1:
+            # Missed something; ask once per gap for a replay from bot_seq
+            if self._sync_requested_at != self.bot_seq:
+                self._sync_requested_at = self.bot_seq
+                await self.send_to_bot({"event": "SYNC", "acked": self.bot_seq})
+            return
+        elif event_type == "CHATTER_JOIN":
+            name = data["name"]
+            settings = data.get("settings")
+            if name not in self.chatter_list:
+                self.chatter_list.append(name)
+                self.chatters_data[name] = settings
+                self.publish_delta(joined={name: settings})
+            elif self.chatters_data.get(name) != settings:
+                # Rejoined with different settings; clients already list them
+                self.chatters_data[name] = settings
+                self.publish_delta(changed={name: settings})
+        elif event_type == "CHATTER_LEAVE":
+            name = data["name"]
+            if name in self.chatter_list:
+                self.chatter_list.remove(name)
+                self.chatters_data.pop(name, None)
+                self.publish_delta(left=[name])
+        elif event_type == "CURRENT_CHATTER":
+            if data.get("name") != self.current_chatter:
+                self.current_chatter = data.get("name")
+                self.publish_delta(current_chatter=self.current_chatter)
+
+        self.bot_seq = seq
+        self._sync_requested_at = None
+        self._schedule_save()
+        await self.send_to_bot({"event": "ACK", "seq": seq})
+
+    # Persistence
+
+    def load_state(self):
+        if self.state_path is None or not self.state_path.exists():
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable chatter state: {e}")
+            return
+        self.bot_session = stored.get("session")
+        self.bot_seq = stored.get("seq", 0)
+        self.chatter_list = stored.get("chatter_list", [])
+        self.chatters_data = stored.get("chatters_data", {})
+        self.current_chatter = stored.get("current_chatter")
 
-                for websocket in dead_clients:
-                    await self.disconnect(websocket)
+    def save_state(self):
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name so overlapping saves never write the same file
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.state_path.parent, prefix=self.state_path.stem, suffix=".tmp"
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "session": self.bot_session,
+                    "seq": self.bot_seq,
+                    "chatter_list": self.chatter_list,
+                    "chatters_data": self.chatters_data,
+                    "current_chatter": self.current_chatter,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.state_path)
 
+    def _schedule_save(self):
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
 
-manager = ConnectionManager()
+    async def _save_later(self):
+        # One write per second at most, however busy chat gets
+        await asyncio.sleep(1.0)
+        await asyncio.to_thread(self.save_state)
+
+
+manager = ConnectionManager(
+    state_path=Path(__file__).parent.parent / "data" / "twitch_chatters.json"
+)
+
+
+@twitch_bot_router.get("/twitch_bot/stats")
+async def get_twitch_bot_stats():
+    return {
+        "web_clients": manager.web_clients.stats(),
+        "deltas_sent": manager.deltas_sent,
+        "db": twitch_db.stats(),
+    }
 
 @twitch_bot_router.websocket("/twitch_bot")
 async def websocket_endpoint(websocket: WebSocket):
@@ -100,23 +292,18 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.accept()
         while True:
             data = await websocket.receive_json()
-            print(data.get('event'))
-            print(data.get('client_type'))
             if data.get("event") == "CONNECT":
                 client_type = data.get("client_type")
                 if client_type in ["TWITCH_BOT", "WEB_CLIENT"]:
-                    await manager.connect(websocket, client_type)
+                    await manager.connect(websocket, client_type, data.get("session"))
             elif data.get("client_type") == "TWITCH_BOT":
-                if data.get("event") == "TWITCH_BOT_UPDATE":
-                    manager.chatter_list = data.get("data", {}).get("chatter_list")
-                    manager.current_chatter = data.get("data", {}).get("current_chatter")
-                    manager.chatters_data = data.get("data", {}).get("chatters_data")
+                if data.get("event") == "BOT_EVENT":
+                    await manager.apply_bot_event(data)
+                elif data.get("event") == "TWITCH_BOT_UPDATE":
+                    manager.apply_bot_update(data.get("data", {}))
             elif data.get("client_type") == "WEB_CLIENT":
-                chatter_name = data.get('data', {}).get('name')
-                print(f"Updating settings for {chatter_name if chatter_name else 'None'}")
                 if data.get("event") == "UPDATE_SETTINGS":
                     settings_data = data.get('data', {})
-                    print(f"Settings data: {settings_data}")
                     settings = {
                         'name': settings_data.get('name'),
                         'is_muted': settings_data.get('is_muted'),
@@ -124,13 +311,18 @@ async def websocket_endpoint(websocket: WebSocket):
                         'tts_length': settings_data.get('tts_length'),
                         'kill_tts': settings_data.get('kill_tts', False)
                     }
-                    manager.chatters_data[settings['name']] = settings
-                    manager.update_settings[settings['name']] = settings
-                    await update_user_settings(settings_data.get('name'), settings)
+                    manager.apply_settings(settings, source=websocket)
+                    await manager.send_to_bot({
+                        'event': 'UPDATE_SETTINGS',
+                        'username': settings['name'],
+                        'data': settings
+                    })
+                    twitch_db.queue_settings(settings['name'], settings)
 
                 elif data.get("event") == "GET_USER_SETTINGS":
-                    user_settings = await get_user_settings(data.get('data', {}).get('username'))
-                    print(user_settings)
+                    user_settings = await twitch_db.get_user_settings(
+                        data.get('data', {}).get('username')
+                    )
                     await websocket.send_json({
                         'event': 'USER_SETTINGS',
                         'data': user_settings
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend runs as the ``app`` package from this directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("aiosqlite")
+
+from app.websockets.twitch_bot import ConnectionManager
+
+
+class BotSocket:
+    """Records what the backend sends to the bot."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def bot_event(seq, event_type, data, session="bot-1"):
+    return {"event": "BOT_EVENT", "session": session, "seq": seq, "type": event_type, "data": data}
+
+
+SETTINGS = {"is_muted": "false", "message_replace": "", "tts_length": 60}
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConnectionManager(state_path=tmp_path / "twitch_chatters.json")
+    manager.twitch_bot_websocket = BotSocket()
+    manager.deltas = []
+    manager.web_clients.publish = manager.deltas.append
+    return manager
+
+
+def apply(manager, *messages):
+    async def run():
+        for message in messages:
+            await manager.apply_bot_event(message)
+        if manager._save_task is not None:
+            manager._save_task.cancel()
+    asyncio.run(run())
+    return manager.twitch_bot_websocket.sent
+
+
+def test_events_apply_in_order_and_replays_are_only_acked(manager):
+    sent = apply(
+        manager,
+        bot_event(1, "SNAPSHOT", {"chatter_list": [], "chatters_data": {}}),
+        bot_event(2, "CHATTER_JOIN", {"name": "alice", "settings": SETTINGS}),
+        bot_event(2, "CHATTER_JOIN", {"name": "alice", "settings": SETTINGS}),
+    )
+    assert manager.chatter_list == ["alice"]
+    assert manager.bot_seq == 2
+    assert sent == [{"event": "ACK", "seq": 1}, {"event": "ACK", "seq": 2}, {"event": "ACK", "seq": 2}]
+
+
+def test_gap_asks_for_one_replay(manager):
+    sent = apply(
+        manager,
+        bot_event(1, "SNAPSHOT", {}),
+        bot_event(3, "CURRENT_CHATTER", {"name": "alice"}),
+        bot_event(4, "CURRENT_CHATTER", {"name": "bob"}),
+    )
+    assert manager.bot_seq == 1
+    assert manager.current_chatter is None
+    assert sent[1:] == [{"event": "SYNC", "acked": 1}]
+
+
+def test_unknown_session_asks_for_a_snapshot(manager):
+    sent = apply(
+        manager,
+        bot_event(1, "SNAPSHOT", {}),
+        bot_event(2, "CURRENT_CHATTER", {"name": "alice"}, session="bot-2"),
+        bot_event(3, "CURRENT_CHATTER", {"name": "alice"}, session="bot-2"),
+    )
+    assert sent[1:] == [{"event": "SYNC", "acked": None}]
+
+
+def test_rejoin_publishes_change_not_join(manager):
+    apply(
+        manager,
+        bot_event(1, "SNAPSHOT", {}),
+        bot_event(2, "CHATTER_JOIN", {"name": "alice", "settings": SETTINGS}),
+        bot_event(3, "CHATTER_JOIN", {"name": "alice", "settings": SETTINGS}),
+        bot_event(4, "CHATTER_JOIN", {"name": "alice", "settings": dict(SETTINGS, tts_length=30)}),
+    )
+    deltas = [message["data"] for message in manager.deltas]
+    assert deltas == [
+        {"joined": {"alice": SETTINGS}},
+        {"changed": {"alice": dict(SETTINGS, tts_length=30)}},
+    ]
+
+
+def test_saved_state_resumes_the_same_session(manager, tmp_path):
+    apply(
+        manager,
+        bot_event(1, "SNAPSHOT", {}),
+        bot_event(2, "CHATTER_JOIN", {"name": "alice", "settings": SETTINGS}),
+    )
+    manager.save_state()
+    assert list(tmp_path.iterdir()) == [manager.state_path]
+
+    restarted = ConnectionManager(state_path=manager.state_path)
+    restarted.load_state()
+    restarted.twitch_bot_websocket = BotSocket()
+    asyncio.run(restarted.request_sync("bot-1"))
+    assert restarted.chatter_list == ["alice"]
+    assert restarted.twitch_bot_websocket.sent == [{"event": "SYNC", "acked": 2}]
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from app.db.db_manager import DatabaseManager
+from app.db.schema import MONTHS
+
+
+CHECK = {"fuel_level": 80, "battery_vdc": 26.1, "run_hours": "12:30"}
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(tmp_path / "equipment_check.db")
+    yield manager
+    manager.close()
+
+
+def this_month():
+    return MONTHS[datetime.now().month - 1]
+
+
+def saved_fuel(db):
+    data = db.fleet_data(this_month())
+    return {
+        (generator, phase): fuel
+        for generator, phase, fuel in zip(data["generator"], data["phase"], data["fuel_level"])
+    }
+
+
+def test_missing_phase_keeps_the_saved_check(db):
+    db.save_round({"GEN-A1": {"pre": dict(CHECK, oil_check=True), "post": CHECK}})
+    assert db.save_round({"GEN-A1": {"pre": dict(CHECK, fuel_level=60)}})["saved"] == ["GEN-A1"]
+
+    assert saved_fuel(db) == {("GEN-A1", "pre"): 60, ("GEN-A1", "post"): 80}
+    assert db.month_progress(this_month())["completed"] == {"pre": ["GEN-A1"], "post": ["GEN-A1"]}
+
+
+def test_empty_phase_is_not_written(db):
+    db.save_round({"GEN-A1": {"pre": dict(CHECK, oil_check=True), "post": {}}})
+    assert saved_fuel(db) == {("GEN-A1", "pre"): 80}
+    assert db.check_history(phase="post")["generator"] == []
+
+
+@pytest.mark.parametrize("round_data", [{}, {"GEN-A1": {}}, {"GEN-A1": {"pre": {}, "post": {}}}])
+def test_round_without_checks_is_rejected(db, round_data):
+    result = db.save_round(round_data)
+    assert result["saved"] == []
+    assert result["errors"]
+
+
+@pytest.mark.parametrize("field,value", [
+    ("fuel_level", 55.9),
+    ("run_hours", "12"),
+    ("leaks", "no"),
+    ("oil_check", "false"),
+    ("oil_check", 2),
+])
+def test_invalid_values_are_rejected(db, field, value):
+    result = db.save_round({"GEN-A1": {"pre": dict(CHECK, **{field: value})}})
+    assert result["saved"] == []
+    assert result["errors"]["GEN-A1"]
+
+
+def test_null_note_is_stored_empty(db):
+    db.save_round({"GEN-A1": {"post": dict(CHECK, notes=None, leaks=False)}})
+    assert db.fleet_data(this_month())["notes"] == [""]
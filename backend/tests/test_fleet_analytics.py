@@ -0,0 +1,39 @@
+import pytest
+
+from app.db.db_manager import DatabaseManager
+from app.data.charts.fleet_analytics import FleetFuel, fleet_forecast
+
+
+CHECK = {"fuel_level": 80, "battery_vdc": 26.1, "run_hours": "12:30"}
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(tmp_path / "equipment_check.db")
+    yield manager
+    manager.close()
+
+
+def test_pre_only_round_is_not_a_post_reading(db):
+    assert db.save_round({"GEN-A1": {"pre": dict(CHECK, oil_check=True), "post": {}}})["saved"]
+
+    history = db.check_history(phase="post")
+    assert history["generator"] == []
+
+    forecast = fleet_forecast(FleetFuel(db.gen_names, history))
+    position = forecast["generators"].index("GEN-A1")
+    assert forecast["level"][position] is None
+    assert forecast["days_to_threshold"][position] is None
+    assert "GEN-A1" not in forecast["below_refill"]
+
+
+def test_untouched_history_rows_are_ignored(db):
+    history = {
+        "recorded_at": ["2025-01-01 00:00:00", "2025-02-01 00:00:00"],
+        "generator": ["GEN-A1", "GEN-A1"],
+        "fuel_level": [80, 0],
+        "battery_vdc": [26.1, 0.0],
+        "run_hours": ["12:30", "0:0"],
+    }
+    level, _ = FleetFuel(db.gen_names, history).latest()
+    assert level[db.gen_names.index("GEN-A1")] == 80
@@ -0,0 +1,112 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.db_manager import DatabaseManager
+from app.db.migrate import legacy_tables, migrate_legacy
+from app.db.schema import DEFAULT_VALUES, PHASE_COLUMNS
+
+
+def legacy_table(connection, month, generator, phase, **values):
+    """One old-layout table holding a single row, seeded with the defaults."""
+    table = f"{month}_{generator.lower().replace('-', '_')}_{phase}"
+    columns = PHASE_COLUMNS[phase]
+    connection.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+    row = {**DEFAULT_VALUES, "last_updated": "2024-01-01", **values}
+    connection.execute(
+        f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)})",
+        [row[column] for column in columns],
+    )
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    path = tmp_path / "equipment_check.db"
+    connection = sqlite3.connect(path)
+    reading = {"fuel_level": 70, "battery_vdc": 26.0, "run_hours": "120:15"}
+    legacy_table(connection, "january", "GEN-A1", "pre", oil_check=1, **reading)
+    legacy_table(connection, "january", "GEN-A1", "post", last_updated="2024-01-20",
+                 **dict(reading, fuel_level=65))
+    legacy_table(connection, "february", "GEN-A1", "pre")
+    legacy_table(connection, "february", "GEN-A1", "post")
+    legacy_table(connection, "january", "GEN-B2", "post", last_updated="2023-01-31", **reading)
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_migrate_copies_filled_checks_and_drops_old_tables(legacy_db):
+    connection = sqlite3.connect(legacy_db)
+    assert len(legacy_tables(connection)) == 5
+
+    assert migrate_legacy(connection) == 3
+
+    assert legacy_tables(connection) == []
+    rows = connection.execute(
+        "SELECT year, month, generator, phase, fuel_level FROM generator_checks "
+        "ORDER BY generator, phase"
+    ).fetchall()
+    assert rows == [
+        (2024, 1, "GEN-A1", "post", 65),
+        (2024, 1, "GEN-A1", "pre", 70),
+        (2023, 1, "GEN-B2", "post", 70),
+    ]
+    connection.close()
+
+
+def test_migrate_without_drop_keeps_old_tables(legacy_db):
+    connection = sqlite3.connect(legacy_db)
+    assert migrate_legacy(connection, drop=False) == 3
+    assert len(legacy_tables(connection)) == 5
+    connection.close()
+
+
+def test_opening_a_legacy_db_sets_completion_and_history(legacy_db):
+    db = DatabaseManager(legacy_db)
+    try:
+        progress = db.month_progress("january", year=2024)
+        assert progress["completed"] == {"pre": ["GEN-A1"], "post": ["GEN-A1"]}
+        assert db.month_progress("february", year=2024)["completed"] == {"pre": [], "post": []}
+
+        history = db.check_history(phase="post")
+        assert sorted(zip(history["generator"], history["recorded_at"])) == [
+            ("GEN-A1", "2024-01-20 00:00:00"),
+            ("GEN-B2", "2023-01-31 00:00:00"),
+        ]
+    finally:
+        db.close()
+
+    # Reopening finds nothing left to migrate or backfill
+    db = DatabaseManager(legacy_db)
+    try:
+        assert len(db.check_history()["generator"]) == 3
+    finally:
+        db.close()
+
+
+def test_compact_history_keeps_the_last_check_of_old_months(tmp_path):
+    db = DatabaseManager(tmp_path / "equipment_check.db")
+    try:
+        old = datetime(datetime.now().year - 3, 6, 1, 8)
+        recent = datetime.now() - timedelta(minutes=5)
+        stamps = [old, old + timedelta(hours=1), old + timedelta(hours=2), recent, recent]
+        connection = sqlite3.connect(db.current_db)
+        with connection:
+            connection.executemany(
+                "INSERT INTO check_history (recorded_at, year, month, generator, phase, fuel_level) "
+                "VALUES (?, ?, ?, 'GEN-A1', 'post', ?)",
+                [
+                    (stamp.isoformat(sep=" ", timespec="seconds"), stamp.year, stamp.month, level)
+                    for level, stamp in enumerate(stamps)
+                ],
+            )
+        connection.close()
+
+        assert db.compact_history(keep_days=365) == 2
+        assert db.check_history()["fuel_level"] == [2, 3, 4]
+
+        assert db.compact_history(keep_days=365, keep_years=1) == 1
+        assert db.check_history()["fuel_level"] == [3, 4]
+    finally:
+        db.close()
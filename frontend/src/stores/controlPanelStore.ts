@@ -5,6 +5,8 @@ import { browser } from '$app/environment';
 
 
 let ws: WebSocket;
+// What the server last got from us, per scene, so only changed keys are sent
+let lastSent: Record<string, Partial<ControlPanelSettings>> = {};
 let reconnectAttempts = 0;
 const MAX_RECONNECT_ATTEMPTS = 5;
 const INITIAL_RECONNECT_DELAY = 1000;
@@ -22,6 +24,7 @@ function initWebSocket() {
             ws.onopen = () => {
                 console.log('WebSocket connected');
                 reconnectAttempts = 0; // Reset attempts on successful connection
+                lastSent = {};
                 ws.send(JSON.stringify({'event': 'connect', 'client':'control_panel'}));
             };
 
@@ -56,7 +59,7 @@ if (browser) {
 }
 
 
-interface ControlPanelSettings {
+export interface ControlPanelSettings {
     particleCount: number;
     particleSpeed: number;
     baseSize: number;
@@ -73,13 +76,25 @@ interface ControlPanelSettings {
     collisionForce: number;
     trailColor: number;
 }
-export function sendSettings(settings: ControlPanelSettings) {
+export function sendSettings(settings: ControlPanelSettings, scene: string = 'default') {
     if (browser) {
         localStorage.setItem('controlPanelSettings', JSON.stringify(settings));
         if (ws && ws.readyState === WebSocket.OPEN) {
+            const previous = lastSent[scene] || {};
+            const patch: Partial<ControlPanelSettings> = {};
+            for (const key of Object.keys(settings) as Array<keyof ControlPanelSettings>) {
+                if (previous[key] !== settings[key]) {
+                    (patch as any)[key] = settings[key];
+                }
+            }
+            if (Object.keys(patch).length === 0) {
+                return;
+            }
+            lastSent[scene] = { ...settings };
             ws.send(JSON.stringify({
                 client: 'control_panel',
-                data: settings
+                scene,
+                patch
             }));
         }
     }
@@ -8,6 +8,25 @@ const MAX_RECONNECT_ATTEMPTS = 5;
 const INITIAL_RECONNECT_DELAY = 1000;
 
 export const overlaySettings = writable<ControlPanelSettings | null>(null);
+// Last applied settings version; kept across reconnects so the server can send only what we missed
+let version: number | null = null;
+// Server process the version belongs to; versions restart when the backend does
+let epoch: string | null = null;
+
+function applyOverlayMessage(message: any) {
+    if (message.type === 'snapshot') {
+        version = message.version;
+        epoch = message.epoch;
+        overlaySettings.set(message.data);
+    } else if (message.type === 'patch') {
+        if (version === null || message.epoch !== epoch || message.version !== version + 1) {
+            ws.send(JSON.stringify({ event: 'resync', version, epoch }));
+            return;
+        }
+        version = message.version;
+        overlaySettings.update((settings) => ({ ...(settings as ControlPanelSettings), ...message.data }));
+    }
+}
 
 function initWebSocket() {
     if (browser && reconnectAttempts < MAX_RECONNECT_ATTEMPTS) {
@@ -21,13 +40,14 @@ function initWebSocket() {
             ws.onopen = () => {
                 console.log('WebSocket connected');
                 reconnectAttempts = 0; // Reset attempts on successful connection
-                ws.send(JSON.stringify({'event': 'connect', 'client':'overlay'}));
+                // Browser sources pick their scene with ?scene=name in the source URL
+                const scene = new URLSearchParams(window.location.search).get('scene') || 'default';
+                ws.send(JSON.stringify({'event': 'connect', 'client':'overlay', 'scene': scene, 'version': version, 'epoch': epoch}));
             };
 
             ws.onmessage = (event) => {
                 try {
-                    const data = JSON.parse(event.data);
-                    overlaySettings.set(data);
+                    applyOverlayMessage(JSON.parse(event.data));
                 } catch (error) {
                     console.error('Failed to parse WebSocket message:', error);
                 }
@@ -8,6 +8,53 @@ export const socketStore = writable<{
     latestMessage: null,
 });
 
+export interface AudioStatus {
+    version: number;
+    is_playing: boolean;
+    current_audio: { title?: string; artist?: string; [key: string]: any };
+    position: any;
+    queue: Array<{ title?: string; artist?: string; [key: string]: any }>;
+    auto_play: boolean;
+    reload_on_finish: boolean;
+    volume: number;
+    effects: string[];
+    latency?: any;
+}
+
+export const audioStatus = writable<AudioStatus | null>(null);
+
+function applyStatusMessage(socket: WebSocket, message: any) {
+    audioStatus.update((status) => {
+        if (message.type === 'snapshot') {
+            return { ...message.data, version: message.version };
+        }
+        if (message.type === 'tick') {
+            // Ticks sit outside the version sequence and may be coalesced
+            return status ? { ...status, position: message.position } : status;
+        }
+        // Deltas must apply in order; on a gap ask the server to catch us up
+        if (!status || message.version !== status.version + 1) {
+            if (!status || message.version > status.version) {
+                socket.send(JSON.stringify({ event: 'resync', version: status?.version ?? null }));
+            }
+            return status;
+        }
+        const next = { ...status, queue: [...status.queue], version: message.version };
+        for (const op of message.ops) {
+            if (op.op === 'set') {
+                (next as any)[op.key] = op.value;
+            } else if (op.op === 'position') {
+                next.position = op.value;
+            } else if (op.op === 'queue_insert') {
+                next.queue.splice(op.index, 0, ...op.items);
+            } else if (op.op === 'queue_remove') {
+                next.queue.splice(op.index, op.count);
+            }
+        }
+        return next;
+    });
+}
+
 export function initializeSocket(): WebSocket | null {
     let socket: WebSocket | null = null;
 
@@ -33,6 +80,9 @@ export function initializeSocket(): WebSocket | null {
             try {
                 const message = JSON.parse(event.data);
                 // console.log('Received message:', message);
+                if (message.event === 'audio_status' && socket) {
+                    applyStatusMessage(socket, message);
+                }
 
                 socketStore.update((store) => ({
                     ...store,
@@ -45,6 +95,7 @@ export function initializeSocket(): WebSocket | null {
 
         socket.onclose = () => {
             console.log('WebSocket connection closed.');
+            audioStatus.set(null);
         };
 
         socket.onerror = (error) => {
@@ -35,10 +35,15 @@ export function initTwitchBotWebSocket() {
         };
 
         ws.onmessage = (event) => {
-            const message = JSON.parse(event.data);
+            let message = JSON.parse(event.data);
             if (message.event === 'UPDATE') {
+                chatterState = message.data;
                 allChattersOptions = message.data.chatters_data;
             }
+            if (message.event === 'CHATTER_DELTA') {
+                // Fold the delta into the last snapshot so subscribers keep seeing UPDATEs
+                message = { event: 'UPDATE', data: applyChatterDelta(message.data) };
+            }
             if (message.event === 'USER_SETTINGS') {
                 userSettings = message.data;
             }
@@ -52,6 +57,40 @@ export function initTwitchBotWebSocket() {
     }
 }
 
+interface ChatterState {
+    chatter_list: string[];
+    current_chatter: string | null;
+    chatters_data: { [name: string]: any };
+}
+
+let chatterState: ChatterState = { chatter_list: [], current_chatter: null, chatters_data: {} };
+
+function applyChatterDelta(delta: any): ChatterState {
+    const chattersData = { ...chatterState.chatters_data };
+    let chatterList = chatterState.chatter_list;
+    if (delta.left) {
+        const left = new Set(delta.left);
+        chatterList = chatterList.filter((name) => !left.has(name));
+        for (const name of delta.left) {
+            delete chattersData[name];
+        }
+    }
+    if (delta.joined) {
+        chatterList = [...chatterList, ...Object.keys(delta.joined)];
+        Object.assign(chattersData, delta.joined);
+    }
+    if (delta.changed) {
+        Object.assign(chattersData, delta.changed);
+    }
+    chatterState = {
+        chatter_list: chatterList,
+        current_chatter: 'current_chatter' in delta ? delta.current_chatter : chatterState.current_chatter,
+        chatters_data: chattersData
+    };
+    allChattersOptions = chattersData;
+    return chatterState;
+}
+
 function handleReconnect() {
     twitch_bot_websocketState.set('disconnected');
     const delay = INITIAL_RECONNECT_DELAY * Math.pow(2, reconnectAttempts);
@@ -7,6 +7,9 @@ from gtts import gTTS
 import os
 import time
 import asyncio
+import random
+import uuid
+from collections import deque
 from aiodesa import Db
 import aiosqlite
 
@@ -27,45 +30,164 @@ class Chatter:
         self.last_message_time = time.time()
 
 
+RECONNECT_INITIAL_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+MAX_OUTBOX = 5000
+
+
 class RollingChatterList:
+    """Chatters seen recently, kept in sync with the backend.
+
+    Every change (join, leave, current chatter) becomes a numbered event in
+    an outbox until the backend acknowledges it. When the connection drops we
+    reconnect with backoff and the backend's ``SYNC`` reply says the last
+    sequence it holds, so only later events are replayed; a full ``SNAPSHOT``
+    is only sent when the backend has nothing usable for this session.
+    """
+
     def __init__(self):
         self.chatters = {}
+        self._current_chatter = None
+        self.session = uuid.uuid4().hex
+        self.seq = 0
+        self.outbox = deque()
+        self.send_queue = asyncio.Queue()
         self.time_delta_loop_task = asyncio.create_task(self.time_delta_loop())
         self.websocket = None
         self.websocket_endpoint = "ws://192.168.1.135:8100/websockets/twitch_bot"
-        self.websocket_listener_task = asyncio.create_task(self.websocket_listener())
-        self.websocket_sender_task = asyncio.create_task(self.websocket_sender())
+        self.websocket_task = asyncio.create_task(self.websocket_loop())
         self.connected = False
-        self.current_chatter = None
-
-    async def websocket_listener(self):
-        async with websockets.connect(self.websocket_endpoint) as websocket:
-            print("Connected to websocket")
-            await websocket.send(
-                json.dumps({"event": "CONNECT", "client_type": "TWITCH_BOT"})
-            )
-            self.websocket = websocket
-            self.connected = True
-            while True:
-                message = await websocket.recv()
-                message = json.loads(message)
-                print(message)
-                if message.get("event") == "UPDATE_SETTINGS":
-                    # {'sockheadrps': {'name': 'sockheadrps', 'is_muted': False, 'message_replace': '', 'tts_length': 60, 'kill_tts': True}}
-                    settings = message.get("data")
-                    chatter_name = settings.get('name')
-                    is_muted = settings.get('is_muted')
-                    message_replace = settings.get('message_replace')
-                    tts_length = settings.get('tts_length')
-                    print(f"Updating settings for {chatter_name}: is_muted={is_muted}, message_replace={message_replace}, tts_length={tts_length}")
-
-                    # async with aiosqlite.connect("database.sqlite3") as aiodb:
-                    #     print("Database connected")
-                    #     await aiodb.execute("UPDATE user_economy SET is_muted = ?, message_replace = ?, tts_length = ? WHERE username = ?", (is_muted, message_replace, tts_length, chatter_name))
-                    #     await aiodb.commit()
 
+    @property
+    def current_chatter(self):
+        return self._current_chatter
+
+    @current_chatter.setter
+    def current_chatter(self, name):
+        if name != self._current_chatter:
+            self._current_chatter = name
+            self.emit("CURRENT_CHATTER", {"name": name})
+
+    def chatter_settings(self, chatter):
+        return {
+            "is_muted": "false" if not chatter.is_muted else "true",
+            "message_replace": chatter.message_replace,
+            "tts_length": chatter.tts_length,
+        }
+
+    def snapshot(self):
+        return {
+            "current_chatter": self._current_chatter,
+            "chatter_list": list(self.chatters.keys()),
+            "chatters_data": {
+                name: self.chatter_settings(chatter) for name, chatter in self.chatters.items()
+            },
+        }
+
+    def emit(self, event_type, data):
+        self.seq += 1
+        message = {
+            "event": "BOT_EVENT",
+            "client_type": "TWITCH_BOT",
+            "session": self.session,
+            "seq": self.seq,
+            "type": event_type,
+            "data": data,
+        }
+        self.outbox.append(message)
+        if len(self.outbox) > MAX_OUTBOX:
+            self.outbox.popleft()
+        if self.connected:
+            self.send_queue.put_nowait(message)
+
+    def resume(self, acked):
+        """Queue whatever the backend hasn't got, given the last seq it holds."""
+        # A SYNC can arrive mid-connection; drop what is still waiting to be
+        # sent so the replay below doesn't queue those events a second time
+        while not self.send_queue.empty():
+            self.send_queue.get_nowait()
+        oldest = self.outbox[0]["seq"] if self.outbox else self.seq + 1
+        if acked is None or acked > self.seq or acked < oldest - 1:
+            # Nothing to replay onto; one snapshot replaces the whole log
+            self.outbox.clear()
+            self.emit("SNAPSHOT", self.snapshot())
+            pending = list(self.outbox)
+        else:
+            pending = [message for message in self.outbox if message["seq"] > acked]
+        for message in pending:
+            self.send_queue.put_nowait(message)
+        self.connected = True
 
+    def acknowledge(self, seq):
+        while self.outbox and self.outbox[0]["seq"] <= seq:
+            self.outbox.popleft()
 
+    async def websocket_loop(self):
+        delay = RECONNECT_INITIAL_DELAY
+        while True:
+            try:
+                async with websockets.connect(self.websocket_endpoint) as websocket:
+                    print("Connected to websocket")
+                    delay = RECONNECT_INITIAL_DELAY
+                    self.websocket = websocket
+                    await websocket.send(
+                        json.dumps(
+                            {
+                                "event": "CONNECT",
+                                "client_type": "TWITCH_BOT",
+                                "session": self.session,
+                                "seq": self.seq,
+                            }
+                        )
+                    )
+                    # Fresh per connection; filled once the backend says where to resume
+                    self.send_queue = asyncio.Queue()
+                    sender = asyncio.create_task(self.websocket_sender(websocket))
+                    try:
+                        await self.websocket_listener(websocket)
+                    finally:
+                        sender.cancel()
+            except Exception as e:
+                # Whatever went wrong, back off and reconnect rather than give up
+                print(f"Backend connection lost: {e!r}")
+            finally:
+                self.websocket = None
+                self.connected = False
+            await asyncio.sleep(delay * random.uniform(1.0, 1.5))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def websocket_sender(self, websocket):
+        while True:
+            message = await self.send_queue.get()
+            await websocket.send(json.dumps(message))
+
+    async def websocket_listener(self, websocket):
+        async for message in websocket:
+            # One bad frame shouldn't cost the connection
+            try:
+                self.handle_message(json.loads(message))
+            except Exception as e:
+                print(f"Ignoring backend message {message!r}: {e!r}")
+
+    def handle_message(self, message):
+        event = message.get("event")
+        if event == "SYNC":
+            self.resume(message.get("acked"))
+        elif event == "ACK":
+            self.acknowledge(message.get("seq", 0))
+        elif event == "UPDATE_SETTINGS":
+            # {'sockheadrps': {'name': 'sockheadrps', 'is_muted': False, 'message_replace': '', 'tts_length': 60, 'kill_tts': True}}
+            settings = message.get("data") or {}
+            chatter_name = settings.get('name')
+            is_muted = settings.get('is_muted')
+            message_replace = settings.get('message_replace')
+            tts_length = settings.get('tts_length')
+            print(f"Updating settings for {chatter_name}: is_muted={is_muted}, message_replace={message_replace}, tts_length={tts_length}")
+            chatter = self.chatters.get(chatter_name)
+            if chatter is not None:
+                chatter.is_muted = is_muted
+                chatter.message_replace = message_replace
+                chatter.tts_length = tts_length
 
     def check_current_chatter(self, chatter, is_muted, message_replace, tts_length):
         if chatter not in self.chatters:
@@ -75,6 +197,10 @@ class RollingChatterList:
             self.chatters[chatter] = Chatter(
                 chatter, is_muted, message_replace, tts_length
             )
+            self.emit(
+                "CHATTER_JOIN",
+                {"name": chatter, "settings": self.chatter_settings(self.chatters[chatter])},
+            )
         else:
             self.chatters[chatter].update_last_message_time()
 
@@ -83,34 +209,9 @@ class RollingChatterList:
             await asyncio.sleep(120)
             for chatter_name, chatter in list(self.chatters.items()):
                 if time.time() - chatter.last_message_time > 10:
-                    print("Deleting chatter")
+                    print(f"Deleting chatter {chatter_name}")
                     del self.chatters[chatter_name]
-                    print(self.chatters)
-
-    async def websocket_sender(self):
-        while True:
-            await asyncio.sleep(2)
-            if self.connected:
-                chatter_data = json.dumps(
-                    {
-                        "event": "TWITCH_BOT_UPDATE",
-                        "client_type": "TWITCH_BOT",
-                        "data": {
-                            "current_chatter": self.current_chatter,
-                            "chatter_list": list(self.chatters.keys()),
-                            "chatters_data": {
-                                chatter: {
-                                    "is_muted": "false" if not self.chatters[chatter].is_muted else "true",
-                                    "message_replace": self.chatters[chatter].message_replace,
-                                    "tts_length": self.chatters[chatter].tts_length,
-                                }
-                                for chatter in self.chatters
-                            },
-                        },
-                    }
-                )
-                # print(chatter_data)
-                await self.websocket.send(chatter_data)
+                    self.emit("CHATTER_LEAVE", {"name": chatter_name})
 
 
 message_alert_sound_minimum = 20